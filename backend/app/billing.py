@@ -0,0 +1,147 @@
+import calendar
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional, Tuple
+from pymongo import UpdateOne
+from bson import ObjectId
+from app.database import CARDS, CARD_STATEMENTS, TRANSACTIONS, get_collection
+from app.cold_storage import hot_only, with_cold_tier
+
+# Used when a card has no due day: the payment window most issuers give after the statement
+DEFAULT_GRACE_DAYS = 20
+# Bumped on the card by every invalidation, so a statement computed before one isn't kept
+VERSION_FIELD = "statementsVersion"
+
+def _shift_month(year: int, month: int, months: int) -> Tuple[int, int]:
+    index = year * 12 + month - 1 + months
+    return index // 12, index % 12 + 1
+
+def _day_in_month(year: int, month: int, day: int) -> date:
+    # A billing day of 31 closes on the 30th, 29th or 28th in shorter months
+    return date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+def cycle_for(day: date, billing_day: int) -> Tuple[date, date]:
+    """(first day, closing day) of the billing cycle that contains the day; both inclusive"""
+    close = _day_in_month(day.year, day.month, billing_day)
+    if day > close:
+        close = _day_in_month(*_shift_month(day.year, day.month, 1), billing_day)
+    previous = _day_in_month(*_shift_month(close.year, close.month, -1), billing_day)
+    return previous + timedelta(days=1), close
+
+def due_date_for(close: date, due_day: Optional[int]) -> date:
+    """First occurrence of the card's due day after the statement closes"""
+    if not due_day:
+        return close + timedelta(days=DEFAULT_GRACE_DAYS)
+    due = _day_in_month(close.year, close.month, due_day)
+    if due <= close:
+        due = _day_in_month(*_shift_month(close.year, close.month, 1), due_day)
+    return due
+
+def _day_of(value) -> str:
+    # Stored dates are ISO strings, so the day is just the "YYYY-MM-DD" prefix
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    return str(value)[:10]
+
+def _daily_spend_pipeline(card_id: str, since: Optional[str]) -> list:
+    match = {"cardId": card_id, "paymentMode": "Credit Card"}
+    if since:
+        match["date"] = {"$gte": since}
+    day = {"$cond": [
+        {"$eq": [{"$type": "$date"}, "string"]},
+        {"$substrCP": ["$date", 0, 10]},
+        {"$dateToString": {"date": "$date", "format": "%Y-%m-%d"}},
+    ]}
+    return [
+        {"$match": hot_only(match)},
+        with_cold_tier(match),
+        {"$group": {"_id": day, "spend": {"$sum": "$amount"}, "count": {"$sum": 1}}},
+    ]
+
+def _statement(card: dict, start: date, close: date, spend: float, count: int, closed: bool) -> dict:
+    spend = round(spend, 2)
+    return {
+        "cardId": str(card["_id"]),
+        "userId": card.get("userId"),
+        "billingDate": card["billingDate"],
+        "cycleStart": start.isoformat(),
+        "cycleEnd": close.isoformat(),
+        "dueDate": due_date_for(close, card.get("dueDate")).isoformat(),
+        "spend": spend,
+        "transactionCount": count,
+        "minimumDue": round(max(spend, 0) * (card.get("minDuePercentage") or 0) / 100, 2),
+        "closed": closed,
+    }
+
+async def card_statements(card: dict, limit: int = 12, today: Optional[date] = None) -> list:
+    """The card's open cycle, computed live, followed by its newest closed statements.
+
+    Closed cycles never change, so each is aggregated once and stored in card_statements.
+    A call only aggregates transactions after the newest stored statement: the cycles
+    that closed since then, which get stored, and the open one. A backdated transaction
+    drops the stored statements from its day on (invalidate_statements), so they are rebuilt.
+    `card` must have been read before this call, as its statementsVersion guards what is stored.
+    """
+    billing_day = card["billingDate"]
+    version = card.get(VERSION_FIELD, 0)
+    open_start, open_end = cycle_for(today or datetime.utcnow().date(), billing_day)
+    statements = get_collection(CARD_STATEMENTS)
+    card_id = str(card["_id"])
+
+    # Stored statements follow the billing day they were cut with; changing it starts over
+    stored = await statements.find(
+        {"cardId": card_id, "billingDate": billing_day}, {"_id": 0}
+    ).sort("cycleEnd", -1).limit(limit).to_list(limit)
+    since = None
+    if stored:
+        since = (date.fromisoformat(stored[0]["cycleEnd"]) + timedelta(days=1)).isoformat()
+
+    # One date-bucketed pass; days are folded into cycles here since cycle bounds vary by month
+    cycles = defaultdict(lambda: [0.0, 0])
+    async for bucket in get_collection(TRANSACTIONS).aggregate(_daily_spend_pipeline(card_id, since)):
+        close = cycle_for(date.fromisoformat(bucket["_id"]), billing_day)[1]
+        cycles[close][0] += bucket["spend"]
+        cycles[close][1] += bucket["count"]
+
+    # Every cycle between the last stored one (or the first transaction) and the open one is closed
+    first = date.fromisoformat(since) if since else min(cycles, default=open_end)
+    closed = []
+    start, close = cycle_for(first, billing_day)
+    while close < open_start:
+        spend, count = cycles.get(close, (0.0, 0))
+        closed.append(_statement(card, start, close, spend, count, True))
+        start, close = close + timedelta(days=1), cycle_for(close + timedelta(days=1), billing_day)[1]
+
+    if closed:
+        await statements.bulk_write([
+            UpdateOne({"cardId": card_id, "cycleEnd": doc["cycleEnd"]}, {"$set": {**doc, "version": version}}, upsert=True)
+            for doc in closed
+        ], ordered=False)
+        # A backdated write may have invalidated while we aggregated; its delete could have run
+        # before these upserts, so drop them again. One that bumps the version later deletes them itself.
+        current = await get_collection(CARDS).find_one({"_id": card["_id"]}, {VERSION_FIELD: 1})
+        if current is not None and current.get(VERSION_FIELD, 0) != version:
+            await statements.delete_many({"cardId": card_id, "cycleEnd": {"$in": [doc["cycleEnd"] for doc in closed]}, "version": version})
+
+    spend, count = cycles.get(open_end, (0.0, 0))
+    current = _statement(card, open_start, open_end, spend, count, False)
+    history = sorted(closed, key=lambda doc: doc["cycleEnd"], reverse=True) + stored
+    return [current, *history[:limit - 1]]
+
+async def invalidate_statements(transactions: Iterable[dict]):
+    """Drop stored statements that a write of backdated credit-card transactions changed"""
+    today = datetime.utcnow().date().isoformat()
+    earliest = {}
+    for doc in transactions:
+        if doc.get("cardId") and doc.get("paymentMode") == "Credit Card":
+            day = _day_of(doc["date"])
+            if day < today and day < earliest.get(doc["cardId"], today):
+                earliest[doc["cardId"]] = day
+    if earliest:
+        # Bumped first, so a card_statements call racing this either sees the change or is deleted below
+        await get_collection(CARDS).update_many(
+            {"_id": {"$in": [ObjectId(card_id) for card_id in earliest]}}, {"$inc": {VERSION_FIELD: 1}}
+        )
+        await get_collection(CARD_STATEMENTS).delete_many(
+            {"$or": [{"cardId": card_id, "cycleEnd": {"$gte": day}} for card_id, day in earliest.items()]}
+        )
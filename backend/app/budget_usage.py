@@ -0,0 +1,148 @@
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable, Optional
+from pymongo import UpdateOne
+from app.database import BUDGET_USAGE, TRANSACTIONS, connect, close, get_collection
+from app.cold_storage import hot_only, with_cold_tier
+from app.events import publish, wants_events
+
+# Category names become field names under "categories", where "." and "$" are not allowed in update paths
+_KEY_ESCAPES = {".": "．", "$": "＄"}
+
+def encode_category(category: str) -> str:
+    for char, escaped in _KEY_ESCAPES.items():
+        category = category.replace(char, escaped)
+    return category
+
+def decode_category(key: str) -> str:
+    for char, escaped in _KEY_ESCAPES.items():
+        key = key.replace(escaped, char)
+    return key
+
+def _month_of(date) -> str:
+    # Stored dates are ISO strings, so the month is just the "YYYY-MM" prefix
+    if isinstance(date, datetime):
+        return date.strftime("%Y-%m")
+    return str(date)[:7]
+
+def _usage_updates(added: Iterable[dict], removed: Iterable[dict]) -> list:
+    """Fold transactions into one $inc per (user, month) rollup document"""
+    rollups = defaultdict(lambda: {"total": 0.0, "count": 0, "categories": defaultdict(float)})
+    for sign, docs in ((1, added), (-1, removed)):
+        for doc in docs:
+            rollup = rollups[(doc["userId"], _month_of(doc["date"]))]
+            rollup["total"] += sign * doc["amount"]
+            rollup["count"] += sign
+            rollup["categories"][encode_category(doc["category"])] += sign * doc["amount"]
+
+    now = datetime.utcnow()
+    updates = []
+    for (user_id, month), rollup in rollups.items():
+        inc = {"total": round(rollup["total"], 2), "count": rollup["count"]}
+        for key, amount in rollup["categories"].items():
+            inc[f"categories.{key}"] = round(amount, 2)
+        updates.append(UpdateOne(
+            {"userId": user_id, "monthYear": month},
+            {"$inc": inc, "$set": {"updated_at": now}},
+            upsert=True,
+        ))
+    return updates
+
+def usage_event(doc: dict) -> dict:
+    """budget.usage event payload for a rollup document"""
+    return {
+        "monthYear": doc["monthYear"],
+        "total": doc.get("total", 0),
+        "count": doc.get("count", 0),
+        "categories": {decode_category(key): value for key, value in doc.get("categories", {}).items()},
+    }
+
+async def apply_usage(added: Iterable[dict] = (), removed: Iterable[dict] = ()):
+    """Keep the per-month spent counters in step with inserted, deleted or (both) updated transactions"""
+    added, removed = list(added), list(removed)
+    updates = _usage_updates(added, removed)
+    if updates:
+        await get_collection(BUDGET_USAGE).bulk_write(updates, ordered=False)
+
+    # Send listeners the new totals rather than deltas, so a missed event can't skew them
+    watched = {(doc["userId"], _month_of(doc["date"])) for doc in (*added, *removed) if wants_events(doc["userId"])}
+    if watched:
+        query = {"$or": [{"userId": user_id, "monthYear": month} for user_id, month in watched]}
+        async for usage in get_collection(BUDGET_USAGE).find(query, {"_id": 0}):
+            publish(usage["userId"], "budget.usage", usage_event(usage))
+
+def _escaped(expression, char: str):
+    return {"$replaceAll": {"input": expression, "find": char, "replacement": _KEY_ESCAPES[char]}}
+
+async def rebuild_usage(user_id: Optional[str] = None):
+    """Recompute every rollup document (or one user's) from the transactions collection.
+
+    Each rollup is replaced in place by $merge, so readers never see it missing. Rollups the
+    rebuild didn't write (months left without transactions) are dropped afterwards. Run it with
+    transaction writes stopped: a live $inc landing between the aggregation and the $merge is
+    overwritten, and one for a transaction the aggregation already counted is added twice.
+    """
+    scope = {"userId": user_id} if user_id else {}
+    now = datetime.utcnow()
+    # Millisecond precision, as stored, so the rebuilt rollups don't compare as older than it
+    started = now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+    month = {"$cond": [
+        {"$eq": [{"$type": "$date"}, "string"]},
+        {"$substrCP": ["$date", 0, 7]},
+        {"$dateToString": {"date": "$date", "format": "%Y-%m"}},
+    ]}
+    category = _escaped(_escaped({"$toString": "$category"}, "."), "$")
+
+    await get_collection(TRANSACTIONS).aggregate([
+        {"$match": hot_only(scope)},
+        with_cold_tier(scope),
+        {"$group": {
+            "_id": {"userId": "$userId", "monthYear": month, "category": category},
+            "spent": {"$sum": "$amount"},
+            "count": {"$sum": 1},
+        }},
+        {"$group": {
+            "_id": {"userId": "$_id.userId", "monthYear": "$_id.monthYear"},
+            "total": {"$sum": "$spent"},
+            "count": {"$sum": "$count"},
+            "categories": {"$push": {"k": "$_id.category", "v": {"$round": ["$spent", 2]}}},
+        }},
+        {"$project": {
+            "_id": 0,
+            "userId": "$_id.userId",
+            "monthYear": "$_id.monthYear",
+            "total": {"$round": ["$total", 2]},
+            "count": 1,
+            "categories": {"$arrayToObject": "$categories"},
+            "updated_at": {"$literal": started},
+        }},
+        {"$merge": {
+            "into": BUDGET_USAGE,
+            "on": ["userId", "monthYear"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }},
+    ], allowDiskUse=True).to_list(None)
+    # Live writes stamp updated_at after `started`, so only rollups nothing touched are stale
+    await get_collection(BUDGET_USAGE).delete_many({**scope, "updated_at": {"$lt": started}})
+
+if __name__ == "__main__":
+    from app.indexes import ensure_indexes
+
+    parser = argparse.ArgumentParser(description="Recompute budget usage rollups from transactions; stop transaction writes first")
+    parser.add_argument("--user", help="only rebuild this user's rollups")
+    args = parser.parse_args()
+
+    async def _main():
+        connect()
+        try:
+            await ensure_indexes() # $merge needs the unique userId+monthYear index
+            await rebuild_usage(args.user)
+        finally:
+            close()
+
+    asyncio.run(_main())
+    print("Budget usage rebuilt")
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict, defaultdict
+from typing import Awaitable, Callable, Hashable, Optional, Tuple
+from fastapi import Request, Response
+
+# Resources also written by jobs that run outside the API process (the reconcile job, the
+# rebuild CLIs), which cannot invalidate this cache; they expire sooner instead
+JOB_WRITTEN_RESOURCES = {"cards", "merchants"}
+JOB_WRITTEN_TTL = float(os.getenv("RESPONSE_CACHE_JOB_TTL", "10"))
+
+class CachedBody:
+    __slots__ = ("body", "etag", "expires_at")
+
+    def __init__(self, body: bytes, ttl: float):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.expires_at = time.monotonic() + ttl
+
+class ResponseCache:
+    """Bounded LRU + TTL cache of serialized JSON bodies, keyed (user_id, resource, *args).
+
+    Entries live in this process only; write routes invalidate them here, and the TTL
+    bounds staleness if the API ever runs as several workers or a job writes the data.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple, CachedBody]" = OrderedDict()
+        # Bumped on every invalidation of a user, so a load that raced one isn't stored
+        self._generations = defaultdict(int)
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Tuple) -> Optional[CachedBody]:
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def generation(self, key: Tuple) -> int:
+        return self._generations.get(key[0], 0)
+
+    def set(self, key: Tuple, body: bytes, generation: Optional[int] = None) -> CachedBody:
+        """Cache a body, unless the user was invalidated since `generation` was read"""
+        ttl = min(self.ttl, JOB_WRITTEN_TTL) if key[1] in JOB_WRITTEN_RESOURCES else self.ttl
+        entry = CachedBody(body, ttl)
+        if generation is not None and generation != self.generation(key):
+            return entry
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def invalidate(self, user_id: Hashable, *resources: str):
+        """Drop a user's entries for the given resources, or all of them if none are given"""
+        user_id = str(user_id)
+        self._generations[user_id] += 1
+        stale = [
+            key for key in self._entries
+            if key[0] == user_id and (not resources or key[1] in resources)
+        ]
+        for key in stale:
+            del self._entries[key]
+        self.invalidations += len(stale)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "maxEntries": self.max_entries,
+            "ttlSeconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "notModified": self.not_modified,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "60")),
+)
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+async def cached_json(request: Request, key: Tuple, load: Callable[[], Awaitable[bytes]]) -> Response:
+    """Serve a JSON body from the cache (or load and cache it), answering 304 when the ETag matches"""
+    entry = response_cache.get(key)
+    if entry is None:
+        # A write that invalidates the key while load() runs must not leave its result cached
+        generation = response_cache.generation(key)
+        entry = response_cache.set(key, await load(), generation)
+
+    headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request, entry.etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import os
+from typing import Optional
+from app.database import BANK_ACCOUNTS, BUDGETS, BUDGET_USAGE, CARDS, TRANSACTIONS, get_database, supports_transactions
+from app.budget_usage import usage_event
+from app.cold_storage import COMPACTED_FIELD
+from app.events import broker, transaction_event
+
+logger = logging.getLogger(__name__)
+
+# Feed events from MongoDB change streams (replica sets only) instead of from the write routes
+CHANGE_STREAMS = os.getenv("EVENTS_CHANGE_STREAMS", "").lower() in ("1", "true", "yes")
+
+class ChangeStreamFeed:
+    """Publishes events for every change on the replica set, whichever process made it"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._resume_token = None
+
+    async def start(self) -> bool:
+        if not CHANGE_STREAMS:
+            return False
+        if not await supports_transactions():
+            logger.warning("EVENTS_CHANGE_STREAMS needs a replica set; events come from this process's writes only")
+            return False
+        broker.change_streams = True
+        self._task = asyncio.create_task(self._run())
+        return True
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            broker.change_streams = False
+
+    async def _run(self):
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": [TRANSACTIONS, CARDS, BUDGETS, BUDGET_USAGE, BANK_ACCOUNTS]},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+        }}]
+        while True:
+            try:
+                # Deletes only carry a user id with pre-images enabled on the collection (MongoDB 6.0+)
+                async with get_database().watch(
+                    pipeline,
+                    full_document="updateLookup",
+                    full_document_before_change="whenAvailable",
+                    resume_after=self._resume_token,
+                ) as stream:
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        self._dispatch(change)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Change stream interrupted; resuming")
+                await asyncio.sleep(1)
+
+    def _dispatch(self, change: dict):
+        collection = change["ns"]["coll"]
+        operation = change["operationType"]
+        doc = change.get("fullDocument") or change.get("fullDocumentBeforeChange")
+        if not doc or not doc.get("userId"):
+            return
+        user_id = doc["userId"]
+
+        if collection == TRANSACTIONS:
+            if operation == "insert":
+                broker.publish(user_id, "transaction.created", transaction_event(doc))
+            elif operation == "delete" and not doc.get(COMPACTED_FIELD):
+                # Compaction deletes are moves into the cold tier; the transaction still exists
+                broker.publish(user_id, "transaction.deleted", transaction_event(doc))
+        elif collection == CARDS:
+            if operation == "insert":
+                broker.publish(user_id, "card.created", doc)
+            elif operation != "delete":
+                broker.publish(user_id, "card.outstanding", {"cardId": doc["_id"], "currentOutstanding": doc.get("currentOutstanding")})
+        elif collection == BUDGET_USAGE and operation != "delete":
+            broker.publish(user_id, "budget.usage", usage_event(doc))
+        elif collection == BUDGETS and operation != "delete":
+            broker.publish(user_id, "budget.updated", doc)
+        elif collection == BANK_ACCOUNTS:
+            broker.publish(user_id, "bank.deleted" if operation == "delete" else "bank.created", doc)
+
+change_feed = ChangeStreamFeed()
@@ -0,0 +1,365 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.database import (
+    JOB_CHECKPOINTS,
+    REPORTING_READ_CONCERN,
+    REPORTING_READ_PREFERENCE,
+    TRANSACTIONS,
+    TRANSACTION_BUCKETS,
+    connect,
+    close,
+    get_client,
+    get_collection,
+    supports_transactions,
+)
+from app.outstanding import PENDING_FIELD
+from app.queries import cursor_position, decode_cursor
+
+logger = logging.getLogger(__name__)
+
+# Months (including the current one) kept as one document per transaction
+HOT_MONTHS = int(os.getenv("TRANSACTION_HOT_MONTHS", "12"))
+# How often the background job compacts older months into buckets; 0 turns it off
+COMPACTION_INTERVAL = float(os.getenv("TRANSACTION_COMPACTION_HOURS", "24")) * 3600
+COMPACTION_LEASE = timedelta(hours=1)
+# Set on a transaction before compaction deletes it, so the delete's pre-image tells the change
+# stream feed it was moved rather than deleted by its user, and reads merged with the buckets
+# skip it while a standalone move has it in both tiers; bucketed copies never carry it
+COMPACTED_FIELD = "compacted"
+# Transactions per bucket document; a month with more spans several, far below the 16 MB limit
+BUCKET_SIZE = int(os.getenv("TRANSACTION_BUCKET_SIZE", "1000"))
+LEASE_ID = "compact_transactions"
+
+def _month_of(date) -> str:
+    if isinstance(date, datetime):
+        return date.strftime("%Y-%m")
+    return str(date)[:7]
+
+def _sort_key(doc: dict):
+    # Listing order, (date desc, _id desc) once reversed; stored dates are ISO strings
+    date = doc.get("date")
+    return (date.isoformat() if isinstance(date, datetime) else str(date), doc["_id"])
+
+def hot_cutoff(hot_months: int = HOT_MONTHS, now: Optional[datetime] = None) -> str:
+    """Stored date before which transactions belong in buckets: the first day of the oldest hot month"""
+    now = now or datetime.utcnow()
+    index = now.year * 12 + now.month - 1 - (hot_months - 1)
+    return datetime(index // 12, index % 12 + 1, 1).isoformat()
+
+def hot_only(query: dict) -> dict:
+    """Filter for the hot side of a read merged with the buckets, leaving out transactions being moved"""
+    return {**query, COMPACTED_FIELD: {"$ne": True}}
+
+def _unflagged(doc: dict) -> dict:
+    doc.pop(COMPACTED_FIELD, None)
+    return doc
+
+def _buckets(reporting: bool = False):
+    if reporting:
+        return get_collection(TRANSACTION_BUCKETS, REPORTING_READ_PREFERENCE, REPORTING_READ_CONCERN)
+    return get_collection(TRANSACTION_BUCKETS)
+
+def _bucket_scope(match: dict) -> dict:
+    """Bucket filter implied by a transaction filter's userId and cardId conditions"""
+    scope = {}
+    if "userId" in match:
+        scope["userId"] = match["userId"]
+    if "cardId" in match:
+        scope["cardIds"] = match["cardId"]
+    return scope
+
+def _month_range(date_range: Optional[dict], before=None) -> dict:
+    months = {}
+    if before is not None:
+        months["$lte"] = _month_of(before)
+    # Only ranges written by transaction_filters / month_bounds; an exact date is left to the $match
+    if isinstance(date_range, dict):
+        if "$gte" in date_range:
+            months["$gte"] = _month_of(date_range["$gte"])
+        if "$lt" in date_range:
+            months["$lte"] = min(months.get("$lte", "9999-12"), _month_of(date_range["$lt"]))
+    return months
+
+def with_cold_tier(match: dict) -> dict:
+    """$unionWith stage that adds the bucketed transactions matching `match` to a pipeline over transactions"""
+    scope = _bucket_scope(match)
+    months = _month_range(match.get("date"))
+    if months:
+        scope["monthYear"] = months
+    return {"$unionWith": {"coll": TRANSACTION_BUCKETS, "pipeline": [
+        {"$match": scope},
+        {"$unwind": "$transactions"},
+        {"$replaceRoot": {"newRoot": "$transactions"}},
+        {"$match": match},
+    ]}}
+
+def _cold_pipeline(scope: dict, query: dict, projection: Optional[dict], limit: Optional[int] = None) -> list:
+    pipeline = [
+        {"$match": scope},
+        {"$unwind": "$transactions"},
+        {"$replaceRoot": {"newRoot": "$transactions"}},
+        {"$match": query},
+        {"$sort": {"date": -1, "_id": -1}},
+    ]
+    if limit:
+        pipeline.append({"$limit": limit})
+    if projection:
+        pipeline.append({"$project": projection})
+    return pipeline
+
+async def _iter_cold(scope: dict, query: dict, projection: Optional[dict] = None, limit: Optional[int] = None, reporting: bool = False) -> AsyncIterator[dict]:
+    """Bucketed transactions matching `query` in listing order.
+
+    Months are disjoint, so sorting one month's buckets at a time, newest month first, yields
+    one sorted stream and a limit stops before the older months are read at all.
+    """
+    months = sorted(await _buckets(reporting).distinct("monthYear", scope), reverse=True)
+    for month in months:
+        pipeline = _cold_pipeline({**scope, "monthYear": month}, query, projection, limit)
+        async for doc in _buckets(reporting).aggregate(pipeline, allowDiskUse=True):
+            yield doc
+            if limit:
+                limit -= 1
+                if not limit:
+                    return
+
+async def merge_cold(hot: list, query: dict, limit: int, projection: Optional[dict] = None, cursor: Optional[str] = None) -> list:
+    """Merge one page of hot transactions with the bucketed ones that sort into it.
+
+    `query` is the page's filter without the cursor and must carry the userId or cardId it lists.
+    """
+    before = None
+    if cursor:
+        before = cursor_position(cursor)[0]
+    scope = _bucket_scope(query)
+    months = _month_range(query.get("date"), before)
+    if months:
+        scope["monthYear"] = months
+    newest = await _buckets().find_one(scope, {"monthYear": 1}, sort=[("monthYear", DESCENDING)])
+    if newest is None:
+        return hot
+    # A full page that ends after the newest bucketed month has nothing to merge
+    if len(hot) >= limit and _month_of(hot[-1]["date"]) > newest["monthYear"]:
+        return hot
+
+    if cursor:
+        query = {"$and": [query, decode_cursor(cursor)]}
+    cold = [doc async for doc in _iter_cold(scope, query, projection, limit)]
+    merged = sorted([*hot, *cold], key=_sort_key, reverse=True)
+    return merged[:limit]
+
+async def iter_with_cold(hot_cursor, query: dict, projection: Optional[dict] = None, reporting: bool = False) -> AsyncIterator[dict]:
+    """Stream a (date desc, _id desc) sorted cursor merged with the bucketed transactions matching `query`"""
+    scope = _bucket_scope(query)
+    months = _month_range(query.get("date"))
+    if months:
+        scope["monthYear"] = months
+    cold_cursor = _iter_cold(scope, query, projection, reporting=reporting)
+
+    hot = await anext(hot_cursor, None)
+    cold = await anext(cold_cursor, None)
+    while hot is not None or cold is not None:
+        if cold is None or (hot is not None and _sort_key(hot) > _sort_key(cold)):
+            yield hot
+            hot = await anext(hot_cursor, None)
+        else:
+            yield cold
+            cold = await anext(cold_cursor, None)
+
+async def search_cold(user_id: str, words: str, filters: dict, limit: int, projection: Optional[dict] = None) -> list:
+    """Bucketed transactions whose merchant, description or notes contain any of the words, newest first.
+
+    The text index only covers the hot tier, so this is a scan of the user's buckets.
+    """
+    terms = [re.escape(word) for word in words.split() if word]
+    if not terms:
+        return []
+    pattern = {"$regex": "|".join(terms), "$options": "i"}
+    query = {**filters, "userId": user_id, "$or": [{"merchant": pattern}, {"description": pattern}, {"notes": pattern}]}
+    scope = _bucket_scope(query)
+    months = _month_range(filters.get("date"))
+    if months:
+        scope["monthYear"] = months
+    return [doc async for doc in _iter_cold(scope, query, projection, limit)]
+
+async def delete_cold(transaction_id) -> Optional[dict]:
+    """Remove a transaction from its bucket and return it, or None if no bucket holds it"""
+    bucket = await _buckets().find_one_and_update(
+        {"transactions._id": transaction_id},
+        {"$pull": {"transactions": {"_id": transaction_id}}, "$inc": {"count": -1}, "$set": {"updated_at": datetime.utcnow()}},
+        projection={"transactions": {"$elemMatch": {"_id": transaction_id}}},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if bucket is None or not bucket.get("transactions"):
+        return None
+    return bucket["transactions"][0]
+
+async def _push(user_id: str, month: str, docs: list, session=None):
+    """Append transactions to the month's buckets, starting a new bucket when they are full"""
+    buckets = get_collection(TRANSACTION_BUCKETS)
+    for start in range(0, len(docs), BUCKET_SIZE):
+        chunk = docs[start:start + BUCKET_SIZE]
+        await buckets.update_one(
+            {"userId": user_id, "monthYear": month, "count": {"$lte": BUCKET_SIZE - len(chunk)}},
+            {
+                # Appends, so a concurrent delete_cold's $pull is never overwritten
+                "$push": {"transactions": {"$each": chunk}},
+                "$inc": {"count": len(chunk)},
+                "$addToSet": {"cardIds": {"$each": sorted({doc["cardId"] for doc in chunk if doc.get("cardId")})}},
+                "$set": {"updated_at": datetime.utcnow()},
+            },
+            upsert=True,
+            session=session,
+        )
+
+async def _compact_month(user_id: str, month: str, ids: list) -> int:
+    """Move these hot transactions of one user's month into its buckets; returns how many moved"""
+    buckets = get_collection(TRANSACTION_BUCKETS)
+    transactions = get_collection(TRANSACTIONS)
+    movable = {"_id": {"$in": ids}, PENDING_FIELD: {"$ne": True}}
+
+    if await supports_transactions():
+        async def move(session):
+            # Read inside the transaction, so a delete since the scan conflicts instead of being undone
+            docs = await transactions.find(movable, session=session).to_list(None)
+            await _push(user_id, month, docs, session)
+            moved = {"_id": {"$in": [doc["_id"] for doc in docs]}}
+            await transactions.update_many(moved, {"$set": {COMPACTED_FIELD: True}}, session=session)
+            result = await transactions.delete_many(moved, session=session)
+            return result.deleted_count
+
+        async with await get_client().start_session() as session:
+            return await session.with_transaction(move)
+
+    # Standalone servers: flag the transactions so reads take them from the buckets only, copy them
+    # into the buckets so a crash loses nothing, then remove each transaction and reconcile its copy
+    # with what was actually removed. A run that stops midway leaves them flagged for the next one
+    await transactions.update_many(movable, {"$set": {COMPACTED_FIELD: True}})
+    docs = [_unflagged(doc) for doc in await transactions.find({**movable, COMPACTED_FIELD: True}).to_list(None)]
+    bucketed = set(await buckets.distinct(
+        "transactions._id", {"userId": user_id, "monthYear": month, "transactions._id": {"$in": ids}}
+    )) & set(ids) # Copied by a run that stopped before deleting them
+    await _push(user_id, month, [doc for doc in docs if doc["_id"] not in bucketed])
+    moved = 0
+    for doc in docs:
+        removed = await transactions.find_one_and_delete({"_id": doc["_id"]})
+        if removed is None:
+            # Deleted by its user since the scan; the bucket must not bring it back
+            await buckets.update_one(
+                {"transactions._id": doc["_id"]},
+                {"$pull": {"transactions": {"_id": doc["_id"]}}, "$inc": {"count": -1}},
+            )
+            continue
+        moved += 1
+        if _unflagged(removed) != doc or doc["_id"] in bucketed:
+            await buckets.update_one({"transactions._id": doc["_id"]}, {"$set": {"transactions.$": removed}})
+    return moved
+
+async def compact_transactions(hot_months: int = HOT_MONTHS, user_id: Optional[str] = None) -> dict:
+    """Move transactions older than the hot months into per-user, per-month bucket documents"""
+    if hot_months < 1:
+        raise ValueError("At least the current month must stay in the hot tier")
+    cutoff = hot_cutoff(hot_months)
+    query = {"date": {"$lt": cutoff}, PENDING_FIELD: {"$ne": True}}
+    if user_id:
+        query["userId"] = user_id
+    report = {"cutoff": cutoff, "months": 0, "moved": 0}
+
+    # userId_date index order, so each (user, month) arrives as one run of documents; they are
+    # moved a bucket's worth at a time to keep each step (and transaction) small
+    cursor = get_collection(TRANSACTIONS).find(query, {"userId": 1, "date": 1}).sort([("userId", 1), ("date", -1), ("_id", -1)])
+    current, ids = None, []
+    async for doc in cursor:
+        key = (doc["userId"], _month_of(doc["date"]))
+        if ids and (key != current or len(ids) >= BUCKET_SIZE):
+            report["moved"] += await _compact_month(*current, ids)
+            ids = []
+        if key != current:
+            report["months"] += 1
+        current = key
+        ids.append(doc["_id"])
+    if ids:
+        report["moved"] += await _compact_month(*current, ids)
+    return report
+
+async def _acquire_lease(owner: str) -> bool:
+    """Take the compaction lease so only one worker process compacts at a time"""
+    now = datetime.utcnow()
+    try:
+        await get_collection(JOB_CHECKPOINTS).find_one_and_update(
+            {"_id": LEASE_ID, "$or": [{"lockedUntil": {"$lt": now}}, {"owner": owner}]},
+            {"$set": {"owner": owner, "lockedUntil": now + COMPACTION_LEASE}},
+            upsert=True,
+        )
+    except DuplicateKeyError: # The upsert lost to an unexpired lease held by another worker
+        return False
+    return True
+
+async def _release_lease(owner: str):
+    await get_collection(JOB_CHECKPOINTS).delete_one({"_id": LEASE_ID, "owner": owner})
+
+class CompactionWorker:
+    """Runs compact_transactions every `interval` seconds in the background"""
+
+    def __init__(self, interval: float = COMPACTION_INTERVAL):
+        self.interval = interval
+        self.owner = f"{os.uname().nodename}:{os.getpid()}"
+        self._task: Optional[asyncio.Task] = None
+        self._stop = asyncio.Event()
+
+    def start(self):
+        if self._task is None and self.interval > 0 and HOT_MONTHS > 0:
+            self._stop = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._stop.set()
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        # Wait one interval first so a restart loop never turns into a compaction loop
+        while not await self._sleep(self.interval):
+            try:
+                if await _acquire_lease(self.owner):
+                    try:
+                        report = await compact_transactions()
+                        logger.info("Compacted %d transactions in %d months before %s", report["moved"], report["months"], report["cutoff"])
+                    finally:
+                        await _release_lease(self.owner)
+            except Exception:
+                logger.exception("Transaction compaction failed")
+
+    async def _sleep(self, seconds: float) -> bool:
+        """Sleep, returning True early if the worker is stopping"""
+        try:
+            await asyncio.wait_for(self._stop.wait(), timeout=seconds)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+compaction_worker = CompactionWorker()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact old transactions into per-user monthly buckets")
+    parser.add_argument("--hot-months", type=int, default=HOT_MONTHS, help="months kept as individual documents")
+    parser.add_argument("--user", help="only compact this user's transactions")
+    args = parser.parse_args()
+
+    async def _main():
+        connect()
+        try:
+            print(json.dumps(await compact_transactions(args.hot_months, args.user), indent=2))
+        finally:
+            close()
+
+    asyncio.run(_main())
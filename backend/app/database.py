@@ -1,18 +1,143 @@
+import asyncio
+import logging
 import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from typing import Callable, Optional
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import ReadPreference
+from pymongo.read_concern import ReadConcern
+from app.metrics import command_listener
+
+logger = logging.getLogger(__name__)
 
 # Default to localhost if not provided
 MONGO_DETAILS = os.getenv("MONGO_DETAILS", "mongodb://localhost:27017")
 
-client = AsyncIOMotorClient(MONGO_DETAILS)
-
 # Database Name
-database = client.semippu
+DATABASE_NAME = os.getenv("MONGO_DATABASE", "semippu")
 
 # Collections
-user_collection = database.get_collection("users")
-bank_collection = database.get_collection("bank_accounts")
-card_collection = database.get_collection("cards")
-transaction_collection = database.get_collection("transactions")
-budget_collection = database.get_collection("budgets")
-goal_collection = database.get_collection("goals")
+USERS = "users"
+BANK_ACCOUNTS = "bank_accounts"
+CARDS = "cards"
+TRANSACTIONS = "transactions"
+BUDGETS = "budgets"
+BUDGET_USAGE = "budget_usage"
+CARD_OUTBOX = "card_outbox"
+JOB_CHECKPOINTS = "job_checkpoints"
+GOALS = "goals"
+# Closed billing cycles, one per card and closing day
+CARD_STATEMENTS = "card_statements"
+# Per-user merchant usage counts behind autocomplete
+MERCHANTS = "merchants"
+# Older months of transactions, one document per user and month
+TRANSACTION_BUCKETS = "transaction_buckets"
+# GridFS bucket; its files and chunks live in profile_photos.files/.chunks
+PROFILE_PHOTOS = "profile_photos"
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+# Read-heavy reporting routes (analytics, export) may be served from secondaries
+REPORTING_READ_PREFERENCE = os.getenv("MONGO_REPORTING_READ_PREFERENCE", "primary")
+REPORTING_READ_CONCERN = os.getenv("MONGO_REPORTING_READ_CONCERN") or None
+if REPORTING_READ_PREFERENCE not in READ_PREFERENCES:
+    raise ValueError(f"Unknown MONGO_REPORTING_READ_PREFERENCE {REPORTING_READ_PREFERENCE}")
+
+class _Connection:
+    client: Optional[AsyncIOMotorClient] = None
+    database: Optional[AsyncIOMotorDatabase] = None
+    collections: dict = {}
+    supports_transactions: Optional[bool] = None
+
+_connection = _Connection()
+
+def client_options() -> dict:
+    """Pool and wire settings for the Motor client, overridable through the environment"""
+    options = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "10")),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    }
+    compressors = os.getenv("MONGO_COMPRESSORS", "")
+    if compressors:
+        options["compressors"] = compressors
+    return options
+
+def connect(client: Optional[AsyncIOMotorClient] = None, **options) -> AsyncIOMotorClient:
+    """Create the shared client; pass `client` to use an already built (e.g. test) client instead"""
+    if _connection.client is None:
+        _connection.client = client or AsyncIOMotorClient(
+            MONGO_DETAILS, event_listeners=[command_listener], **{**client_options(), **options}
+        )
+        _connection.database = _connection.client[DATABASE_NAME]
+        _connection.collections = {}
+        _connection.supports_transactions = None
+    return _connection.client
+
+async def warm_up():
+    """Ping the server and open minPoolSize connections before the first request needs them"""
+    client = get_client()
+    await client.admin.command("ping")
+    min_pool = client_options()["minPoolSize"]
+    if min_pool > 1:
+        await asyncio.gather(*(client.admin.command("ping") for _ in range(min_pool)))
+    logger.info("MongoDB connection pool warmed up (%d connections)", max(min_pool, 1))
+
+async def supports_transactions() -> bool:
+    """Whether the server is a replica set member or mongos, i.e. can run multi-document transactions"""
+    if _connection.supports_transactions is None:
+        try:
+            hello = await get_client().admin.command("hello")
+            _connection.supports_transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception:
+            _connection.supports_transactions = False
+    return _connection.supports_transactions
+
+def close():
+    if _connection.client is not None:
+        _connection.client.close()
+    _connection.client = None
+    _connection.database = None
+    _connection.collections = {}
+
+def get_client() -> AsyncIOMotorClient:
+    if _connection.client is None:
+        raise RuntimeError("MongoDB client is not connected; call app.database.connect() first")
+    return _connection.client
+
+def get_database() -> AsyncIOMotorDatabase:
+    get_client()
+    return _connection.database
+
+def get_collection(name: str, read_preference: Optional[str] = None, read_concern: Optional[str] = None) -> AsyncIOMotorCollection:
+    key = (name, read_preference, read_concern)
+    collection = _connection.collections.get(key)
+    if collection is None:
+        options = {}
+        if read_preference:
+            options["read_preference"] = READ_PREFERENCES[read_preference]
+        if read_concern:
+            options["read_concern"] = ReadConcern(read_concern)
+        collection = get_database().get_collection(name, **options)
+        _connection.collections[key] = collection
+    return collection
+
+def collection_dependency(name: str, read_preference: Optional[str] = None, read_concern: Optional[str] = None) -> Callable[[], AsyncIOMotorCollection]:
+    """FastAPI dependency that hands a route its collection from the lifespan-managed client"""
+    def dependency() -> AsyncIOMotorCollection:
+        return get_collection(name, read_preference, read_concern)
+    return dependency
+
+get_user_collection = collection_dependency(USERS)
+get_bank_collection = collection_dependency(BANK_ACCOUNTS)
+get_card_collection = collection_dependency(CARDS)
+get_transaction_collection = collection_dependency(TRANSACTIONS)
+get_reporting_transaction_collection = collection_dependency(TRANSACTIONS, REPORTING_READ_PREFERENCE, REPORTING_READ_CONCERN)
+get_budget_collection = collection_dependency(BUDGETS)
+get_budget_usage_collection = collection_dependency(BUDGET_USAGE)
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import logging
+import re
+from datetime import datetime
+from pymongo import UpdateOne
+from app.database import TRANSACTIONS, TRANSACTION_BUCKETS, connect, close, get_collection
+from app.billing import invalidate_statements
+from app.cold_storage import _month_of, _push, delete_cold
+from app.queries import stored_date
+
+logger = logging.getLogger(__name__)
+
+# Dates written before the models normalized them keep their offset ("...+00:00", "...Z", "...+05:30")
+_OFFSET = re.compile(r"(Z|[+-][0-9]{2}:[0-9]{2})$")
+OFFSET_DATE = {"$regex": _OFFSET.pattern}
+BATCH_SIZE = 1000
+PROJECTION = {"userId": 1, "cardId": 1, "paymentMode": 1, "date": 1}
+
+def _normalized(date: str) -> str:
+    return stored_date(datetime.fromisoformat(date))
+
+async def _normalize_hot(report: dict):
+    transactions = get_collection(TRANSACTIONS)
+    updates, touched = [], []
+
+    async def flush():
+        if updates:
+            await transactions.bulk_write(updates, ordered=False)
+            await invalidate_statements(touched)
+        updates.clear()
+        touched.clear()
+
+    async for doc in transactions.find({"date": OFFSET_DATE}, PROJECTION):
+        date = _normalized(doc["date"])
+        # Conditional on the old value, so a date edited meanwhile is left alone
+        updates.append(UpdateOne({"_id": doc["_id"], "date": doc["date"]}, {"$set": {"date": date}}))
+        # Both days, as statements were cut by the old one and will be by the new one
+        touched += [doc, {**doc, "date": date}]
+        report["transactions"] += 1
+        if _month_of(date) != _month_of(doc["date"]):
+            report["monthsChanged"] += 1
+        if len(updates) >= BATCH_SIZE:
+            await flush()
+    await flush()
+
+async def _normalize_cold(report: dict):
+    buckets = get_collection(TRANSACTION_BUCKETS)
+    async for bucket in buckets.find({"transactions.date": OFFSET_DATE}, {"userId": 1, "monthYear": 1, "transactions": 1}):
+        touched = []
+        for doc in bucket["transactions"]:
+            if not isinstance(doc.get("date"), str) or not _OFFSET.search(doc["date"]):
+                continue
+            date = _normalized(doc["date"])
+            touched += [doc, {**doc, "date": date}]
+            report["bucketed"] += 1
+            if _month_of(date) == bucket["monthYear"]:
+                await buckets.update_one(
+                    {"_id": bucket["_id"], "transactions": {"$elemMatch": {"_id": doc["_id"], "date": doc["date"]}}},
+                    {"$set": {"transactions.$.date": date}},
+                )
+            else:
+                # Now dated in another month, so it moves to that month's buckets
+                report["monthsChanged"] += 1
+                moved = await delete_cold(doc["_id"])
+                if moved is not None:
+                    await _push(bucket["userId"], _month_of(date), [{**moved, "date": date}])
+        await invalidate_statements(touched)
+
+async def normalize_transaction_dates() -> dict:
+    """Rewrite transaction dates stored with a UTC offset as the naive UTC strings the API now writes.
+
+    Range filters and cursors compare dates as text, so mixed forms sort and page inconsistently.
+    Budget usage rollups are keyed by the month in the old string; rebuild them if any moved.
+    """
+    report = {"transactions": 0, "bucketed": 0, "monthsChanged": 0}
+    await _normalize_hot(report)
+    await _normalize_cold(report)
+    if report["monthsChanged"]:
+        logger.warning("%d transactions changed month; run python -m app.budget_usage", report["monthsChanged"])
+    return report
+
+if __name__ == "__main__":
+    async def _main():
+        connect()
+        try:
+            print(json.dumps(await normalize_transaction_dates(), indent=2))
+        finally:
+            close()
+
+    asyncio.run(_main())
@@ -0,0 +1,72 @@
+import hashlib
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable
+from app.database import TRANSACTION_BUCKETS, get_collection
+from app.cold_storage import hot_cutoff
+from app.merchants import merchant_key
+
+# Written on every new transaction and unique per user, so a second copy fails the insert
+FINGERPRINT_FIELD = "fingerprint"
+IDEMPOTENCY_FIELD = "idempotencyKey"
+DUPLICATE_KEY_ERROR = 11000
+# Identical transactions one user can record on purpose on the same day (allowDuplicate)
+MAX_OCCURRENCES = 50
+
+def _day_of(date) -> str:
+    if isinstance(date, datetime):
+        return date.date().isoformat()
+    return str(date)[:10]
+
+def fingerprint(doc: dict, occurrence: int = 0) -> str:
+    """Hash of who, which card, how much, where and which day; the n-th identical one gets n mixed in"""
+    parts = (
+        doc["userId"],
+        doc.get("cardId") or "",
+        f"{round(doc['amount'], 2):.2f}",
+        merchant_key(doc.get("merchant") or ""),
+        _day_of(doc["date"]),
+        str(occurrence),
+    )
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+def assign_fingerprints(docs: Iterable[dict], seen: defaultdict):
+    """Fingerprint a batch, numbering identical rows so a statement's genuine repeats stay distinct.
+
+    `seen` carries the counts across the batches of one import, so importing the same file
+    twice produces the same fingerprints both times.
+    """
+    for doc in docs:
+        base = fingerprint(doc)
+        doc[FINGERPRINT_FIELD] = fingerprint(doc, seen[base]) if seen[base] else base
+        seen[base] += 1
+
+def duplicate_field(details: dict) -> str:
+    """Which unique key a duplicate key error hit: fingerprint, idempotencyKey or _id"""
+    pattern = (details or {}).get("keyPattern") or {}
+    message = (details or {}).get("errmsg", "")
+    for field in (IDEMPOTENCY_FIELD, FINGERPRINT_FIELD):
+        if field in pattern or field in message:
+            return field
+    return "_id"
+
+async def cold_duplicates(docs: Iterable[dict]) -> set:
+    """Fingerprints of these transactions that already exist in the compacted tier.
+
+    The unique index only covers the hot collection, so backdated inserts into compacted
+    months are checked against the buckets' fingerprint index instead.
+    """
+    cutoff = hot_cutoff()
+    old = [doc[FINGERPRINT_FIELD] for doc in docs if _day_of(doc["date"]) < cutoff[:10]]
+    if not old:
+        return set()
+    found = set()
+    pipeline = [
+        {"$match": {"transactions.fingerprint": {"$in": old}}},
+        {"$unwind": "$transactions"},
+        {"$match": {"transactions.fingerprint": {"$in": old}}},
+        {"$project": {"_id": 0, "fingerprint": "$transactions.fingerprint"}},
+    ]
+    async for doc in get_collection(TRANSACTION_BUCKETS).aggregate(pipeline):
+        found.add(doc["fingerprint"])
+    return found
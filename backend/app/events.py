@@ -0,0 +1,108 @@
+import asyncio
+import itertools
+import logging
+import os
+from collections import defaultdict
+from app.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per connection before a slow client is told to resync instead
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+HEARTBEAT_SECONDS = 15
+
+# Fields of a transaction sent with transaction.created; enough to render it in a list
+TRANSACTION_FIELDS = ("_id", "userId", "cardId", "date", "merchant", "amount", "category", "paymentMode", "isEMI")
+
+_CLOSED = object()
+
+class EventBroker:
+    """In-process pub/sub of per-user change events, fanned out to SSE connections.
+
+    Each connection gets a bounded queue. One that falls behind loses its backlog and gets a
+    single "resync" event, telling the client to refetch. Only connections to this process
+    see events published here; with several workers, use the change stream feed (app.change_feed).
+    """
+
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.change_streams = False
+        self._subscribers = defaultdict(set)
+        self._ids = itertools.count(1)
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(self.queue_size)
+        self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(user_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[user_id]
+
+    def has_subscribers(self, user_id: str) -> bool:
+        return bool(self._subscribers.get(str(user_id)))
+
+    def _frame(self, event_type: str, data: dict) -> str:
+        return f"id: {next(self._ids)}\nevent: {event_type}\ndata: {dumps(data).decode()}\n\n"
+
+    def publish(self, user_id: str, event_type: str, data: dict):
+        """Queue an event for every connection of the user; never blocks the caller"""
+        subscribers = self._subscribers.get(str(user_id))
+        if not subscribers:
+            return
+        frame = self._frame(event_type, data)
+        self.published += 1
+        for queue in subscribers:
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self._frame("resync", {}))
+                self.dropped += 1
+
+    def close(self):
+        """End every open stream, e.g. at shutdown"""
+        for subscribers in self._subscribers.values():
+            for queue in subscribers:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(_CLOSED)
+
+    async def stream(self, user_id: str, is_disconnected):
+        """SSE body for one connection: queued events, with a comment line as heartbeat"""
+        queue = self.subscribe(user_id)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if frame is _CLOSED:
+                    break
+                yield frame
+        finally:
+            self.unsubscribe(user_id, queue)
+
+broker = EventBroker()
+
+def wants_events(user_id: str) -> bool:
+    """Whether a write route should publish (and read back what it needs to) for this user"""
+    return not broker.change_streams and broker.has_subscribers(user_id)
+
+def publish(user_id: str, event_type: str, data: dict):
+    """Publish from a write route; a no-op while the change stream feed is the source"""
+    if not broker.change_streams:
+        broker.publish(user_id, event_type, data)
+
+def transaction_event(doc: dict) -> dict:
+    return {field: doc.get(field) for field in TRANSACTION_FIELDS}
@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator
+
+EXPORT_FIELDS = [
+    "_id", "date", "merchant", "description", "amount", "category",
+    "paymentMode", "cardId", "isEMI", "tags", "notes",
+]
+
+EXPORT_PROJECTION = {field: 1 for field in EXPORT_FIELDS}
+
+# Flush to the client once this many bytes are buffered
+CHUNK_SIZE = 64 * 1024
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+def _export_row(doc: dict) -> dict:
+    row = {field: _plain(doc.get(field)) for field in EXPORT_FIELDS}
+    row["tags"] = [str(tag) for tag in doc.get("tags") or []]
+    return row
+
+async def _chunked(cursor, encode, header: str = "") -> AsyncIterator[str]:
+    """Serialize documents one at a time, yielding the first row immediately and then ~64KB chunks"""
+    buffer = io.StringIO()
+    buffer.write(header)
+    first = True
+    async for doc in cursor:
+        buffer.write(encode(_export_row(doc)))
+        if first or buffer.tell() >= CHUNK_SIZE:
+            first = False
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def stream_ndjson(cursor) -> AsyncIterator[str]:
+    return _chunked(cursor, lambda row: json.dumps(row, separators=(",", ":")) + "\n")
+
+def stream_csv(cursor) -> AsyncIterator[str]:
+    line = io.StringIO()
+    writer = csv.writer(line)
+
+    def encode(row: dict) -> str:
+        line.seek(0)
+        line.truncate()
+        writer.writerow(";".join(value) if isinstance(value, list) else value for value in row.values())
+        return line.getvalue()
+
+    header = io.StringIO()
+    csv.writer(header).writerow(EXPORT_FIELDS)
+    return _chunked(cursor, encode, header.getvalue())
@@ -0,0 +1,108 @@
+import csv
+import re
+from datetime import datetime
+from typing import IO, Iterator, Tuple
+
+# Statement column headers (lowercased, without spaces/underscores) -> TransactionCreate aliases
+CSV_COLUMNS = {
+    "date": "date",
+    "transactiondate": "date",
+    "merchant": "merchant",
+    "payee": "merchant",
+    "name": "merchant",
+    "description": "description",
+    "memo": "description",
+    "amount": "amount",
+    "category": "category",
+    "paymentmode": "paymentMode",
+    "notes": "notes",
+    "tags": "tags",
+    "isemi": "isEMI",
+}
+
+DATE_FORMATS = ("%d/%m/%Y", "%d-%m-%Y", "%d %b %Y", "%d-%b-%Y", "%Y/%m/%d")
+
+_OFX_TAG = re.compile(r"<(/?)(\w+)>([^<\r\n]*)")
+
+def _parse_date(value: str):
+    value = value.strip()
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return value # Let model validation report it
+
+def _parse_amount(value: str):
+    cleaned = re.sub(r"[^\d.\-]", "", value)
+    try:
+        return float(cleaned)
+    except ValueError:
+        return value
+
+def _normalize_header(header: str) -> str:
+    return re.sub(r"[\s_]", "", header or "").lower()
+
+def iter_csv_rows(stream: IO[str]) -> Iterator[Tuple[int, dict]]:
+    """Yield (row number, TransactionCreate fields) for each data line of a CSV statement"""
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [CSV_COLUMNS.get(_normalize_header(h)) for h in header]
+
+    for row_number, values in enumerate(reader, start=1):
+        if not any(v.strip() for v in values):
+            continue
+        row = {}
+        for field, value in zip(columns, values):
+            if field is None or not value.strip():
+                continue
+            if field == "date":
+                row[field] = _parse_date(value)
+            elif field == "amount":
+                row[field] = _parse_amount(value)
+            elif field == "tags":
+                row[field] = [t.strip() for t in value.split(";") if t.strip()]
+            else:
+                row[field] = value.strip()
+        yield row_number, row
+
+def _ofx_row(fields: dict) -> dict:
+    row = {}
+    if "DTPOSTED" in fields:
+        raw = fields["DTPOSTED"][:14]
+        try:
+            row["date"] = datetime.strptime(raw, "%Y%m%d%H%M%S" if len(raw) == 14 else "%Y%m%d")
+        except ValueError:
+            row["date"] = fields["DTPOSTED"]
+    if "TRNAMT" in fields:
+        # OFX charges are negative; credits (payments, refunds) come out non-positive and fail validation
+        amount = _parse_amount(fields["TRNAMT"])
+        row["amount"] = -amount if isinstance(amount, float) else amount
+    if "NAME" in fields or "PAYEE" in fields:
+        row["merchant"] = fields.get("NAME") or fields.get("PAYEE")
+    if "MEMO" in fields:
+        row["description"] = fields["MEMO"]
+    return row
+
+def iter_ofx_rows(stream: IO[str]) -> Iterator[Tuple[int, dict]]:
+    """Yield (row number, TransactionCreate fields) for each <STMTTRN> block of an OFX statement"""
+    row_number = 0
+    fields = None
+    for line in stream:
+        for closing, tag, value in _OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if closing and fields is not None:
+                    row_number += 1
+                    yield row_number, _ofx_row(fields)
+                    fields = None
+                elif not closing:
+                    fields = {}
+            elif fields is not None and not closing and value.strip():
+                fields[tag] = value.strip()
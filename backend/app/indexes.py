@@ -0,0 +1,139 @@
+import argparse
+import asyncio
+import logging
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from app.database import (
+    USERS,
+    BANK_ACCOUNTS,
+    CARDS,
+    TRANSACTIONS,
+    BUDGETS,
+    BUDGET_USAGE,
+    PROFILE_PHOTOS,
+    CARD_STATEMENTS,
+    MERCHANTS,
+    TRANSACTION_BUCKETS,
+    connect,
+    close,
+    get_collection,
+)
+
+logger = logging.getLogger(__name__)
+
+# Indexes every collection must have; create_indexes is a no-op for ones that already exist
+INDEXES = [
+    (TRANSACTIONS, [
+        IndexModel([("userId", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)], name="userId_date"),
+        IndexModel([("cardId", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)], name="cardId_date"),
+        # Only transactions whose card update is still queued, for replay at startup
+        IndexModel([("cardDeltaPending", ASCENDING)], name="cardDeltaPending_partial",
+                   partialFilterExpression={"cardDeltaPending": True}),
+        # Full-text search within one user's transactions; userId must be matched by equality
+        IndexModel([("userId", ASCENDING), ("merchant", TEXT), ("description", TEXT), ("notes", TEXT)],
+                   name="userId_text", weights={"merchant": 5, "description": 2, "notes": 1}),
+        # Duplicate detection; transactions written before these fields existed are left out
+        IndexModel([("fingerprint", ASCENDING)], name="fingerprint_unique", unique=True,
+                   partialFilterExpression={"fingerprint": {"$exists": True}}),
+        IndexModel([("userId", ASCENDING), ("idempotencyKey", ASCENDING)], name="userId_idempotencyKey_unique", unique=True,
+                   partialFilterExpression={"idempotencyKey": {"$exists": True}}),
+    ]),
+    (TRANSACTION_BUCKETS, [
+        # A month can span several capped buckets; compaction appends to one with room left
+        IndexModel([("userId", ASCENDING), ("monthYear", DESCENDING), ("count", ASCENDING)], name="userId_monthYear_count"),
+        IndexModel([("cardIds", ASCENDING), ("monthYear", DESCENDING)], name="cardIds_monthYear"),
+        # Deletes of compacted transactions find their bucket by transaction id
+        IndexModel([("transactions._id", ASCENDING)], name="transactions_id"),
+        IndexModel([("transactions.fingerprint", ASCENDING)], name="transactions_fingerprint"),
+    ]),
+    (USERS, [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ]),
+    (BUDGETS, [
+        IndexModel([("userId", ASCENDING), ("monthYear", ASCENDING)], name="userId_monthYear_unique", unique=True),
+    ]),
+    (BUDGET_USAGE, [
+        IndexModel([("userId", ASCENDING), ("monthYear", ASCENDING)], name="userId_monthYear_unique", unique=True),
+    ]),
+    (BANK_ACCOUNTS, [
+        IndexModel([("userId", ASCENDING)], name="userId"),
+    ]),
+    (CARDS, [
+        IndexModel([("userId", ASCENDING)], name="userId"),
+    ]),
+    (MERCHANTS, [
+        IndexModel([("userId", ASCENDING), ("merchantKey", ASCENDING)], name="userId_merchantKey_unique", unique=True),
+    ]),
+    (CARD_STATEMENTS, [
+        IndexModel([("cardId", ASCENDING), ("cycleEnd", DESCENDING)], name="cardId_cycleEnd_unique", unique=True),
+    ]),
+    (f"{PROFILE_PHOTOS}.files", [
+        IndexModel([("metadata.userId", ASCENDING)], name="metadata_userId"),
+    ]),
+]
+
+_DATE_SORT = [("date", DESCENDING), ("_id", DESCENDING)]
+
+# (route, collection name, filter, sort) for each hot query the routes issue
+QUERY_SHAPES = [
+    ("list_transactions_by_user", TRANSACTIONS, {"userId": ""}, _DATE_SORT),
+    ("list_transactions_by_card", TRANSACTIONS, {"cardId": ""}, _DATE_SORT),
+    ("get_analytics", TRANSACTIONS, {"userId": "", "date": {"$gte": ""}}, None),
+    ("register_user/login_user", USERS, {"email": ""}, None),
+    ("get_budget", BUDGETS, {"userId": "", "monthYear": ""}, None),
+    ("get_budget_usage", BUDGET_USAGE, {"userId": "", "monthYear": ""}, None),
+    ("list_bank_accounts", BANK_ACCOUNTS, {"userId": ""}, None),
+    ("list_cards", CARDS, {"userId": ""}, None),
+    ("suggest_merchants", MERCHANTS, {"userId": "", "count": {"$gt": 0}, "merchantKey": {"$regex": "^a"}}, [("count", DESCENDING)]),
+    ("list_statements", CARD_STATEMENTS, {"cardId": "", "billingDate": 1}, [("cycleEnd", DESCENDING)]),
+]
+
+class QueryPlanError(RuntimeError):
+    pass
+
+async def ensure_indexes():
+    for name, models in INDEXES:
+        created = await get_collection(name).create_indexes(models)
+        logger.info("Ensured indexes on %s: %s", name, ", ".join(created))
+
+def _stages(plan):
+    """Yield every stage name in an explain() plan tree"""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _stages(item)
+
+async def verify_query_plans():
+    """Explain each registered query shape and fail if any would scan a whole collection"""
+    offenders = []
+    for route, name, query, sort in QUERY_SHAPES:
+        cursor = get_collection(name).find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = await cursor.explain()
+        stages = set(_stages(plan.get("queryPlanner", {}).get("winningPlan", {})))
+        if "COLLSCAN" in stages:
+            offenders.append(f"{route} ({name})")
+
+    if offenders:
+        raise QueryPlanError("Collection scan in query plan for: " + ", ".join(offenders))
+
+async def _main(check: bool):
+    connect()
+    try:
+        await ensure_indexes()
+        if check:
+            await verify_query_plans()
+            print("All query shapes use an index")
+    finally:
+        close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create MongoDB indexes and optionally verify query plans")
+    parser.add_argument("--check", action="store_true", help="fail if any route query would do a COLLSCAN")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(args.check))
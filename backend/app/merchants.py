@@ -0,0 +1,141 @@
+import argparse
+import asyncio
+import re
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable, Optional
+from pymongo import UpdateOne
+from app.database import MERCHANTS, TRANSACTIONS, connect, close, get_collection
+from app.budget_usage import encode_category, decode_category
+from app.cache import response_cache
+from app.cold_storage import hot_only, with_cold_tier
+
+SUGGEST_LIMIT = 10
+
+def merchant_key(merchant: str) -> str:
+    """Case- and whitespace-insensitive form merchants are grouped and prefix-matched by"""
+    return " ".join(str(merchant).lower().split())
+
+def _merchant_updates(added: Iterable[dict], removed: Iterable[dict]) -> list:
+    """Fold transactions into one $inc per (user, merchant) document"""
+    merchants = defaultdict(lambda: {"name": None, "count": 0, "categories": defaultdict(int)})
+    for sign, docs in ((1, added), (-1, removed)):
+        for doc in docs:
+            key = merchant_key(doc.get("merchant") or "")
+            if not key:
+                continue
+            merchant = merchants[(doc["userId"], key)]
+            if sign > 0:
+                merchant["name"] = doc["merchant"].strip()
+            merchant["count"] += sign
+            merchant["categories"][encode_category(doc["category"])] += sign
+
+    now = datetime.utcnow()
+    updates = []
+    for (user_id, key), merchant in merchants.items():
+        inc = {"count": merchant["count"]}
+        for category, count in merchant["categories"].items():
+            inc[f"categories.{category}"] = count
+        update = {"$inc": inc, "$set": {"updated_at": now}}
+        if merchant["name"]:
+            # Suggest the spelling the user typed most recently
+            update["$set"]["merchant"] = merchant["name"]
+        updates.append(UpdateOne({"userId": user_id, "merchantKey": key}, update, upsert=True))
+    return updates
+
+async def apply_merchants(added: Iterable[dict] = (), removed: Iterable[dict] = ()):
+    """Keep the per-user merchant index in step with inserted or deleted transactions"""
+    added, removed = list(added), list(removed)
+    updates = _merchant_updates(added, removed)
+    if updates:
+        await get_collection(MERCHANTS).bulk_write(updates, ordered=False)
+        for user_id in {doc["userId"] for doc in (*added, *removed)}:
+            response_cache.invalidate(user_id, "merchants")
+
+def top_category(categories: dict) -> Optional[str]:
+    best = max((item for item in categories.items() if item[1] > 0), key=lambda item: item[1], default=None)
+    return decode_category(best[0]) if best else None
+
+async def suggest_merchants(user_id: str, prefix: str, limit: int = SUGGEST_LIMIT) -> list:
+    """The user's most used merchants starting with the prefix, each with its most frequent category"""
+    query = {"userId": user_id, "count": {"$gt": 0}}
+    key = merchant_key(prefix)
+    if key:
+        # An anchored, case-sensitive regex on the lowercased key is a range scan of the index
+        query["merchantKey"] = {"$regex": "^" + re.escape(key)}
+    docs = await get_collection(MERCHANTS).find(
+        query, {"_id": 0, "merchant": 1, "count": 1, "categories": 1}
+    ).sort("count", -1).limit(limit).to_list(limit)
+    return [
+        {"merchant": doc["merchant"], "category": top_category(doc.get("categories", {})), "count": doc["count"]}
+        for doc in docs
+    ]
+
+async def rebuild_merchants(user_id: Optional[str] = None):
+    """Recompute the merchant index (or one user's) from the transactions collection.
+
+    Each merchant document is overwritten in place rather than deleted and re-added, so
+    suggestions never go empty. Merchants the rebuild didn't write (no transactions left) are
+    dropped afterwards. Run it with transaction writes stopped: a live $inc landing between the
+    aggregation and the write is overwritten, and one for a transaction already counted is
+    added twice.
+    """
+    scope = {"userId": user_id} if user_id else {}
+    now = datetime.utcnow()
+    # Millisecond precision, as stored, so the rebuilt documents don't compare as older than it
+    started = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    pipeline = [
+        {"$match": hot_only(scope)},
+        with_cold_tier(scope),
+        {"$group": {
+            "_id": {"userId": "$userId", "merchant": "$merchant", "category": "$category"},
+            "count": {"$sum": 1},
+        }},
+    ]
+    merchants = defaultdict(lambda: {"spellings": defaultdict(int), "count": 0, "categories": defaultdict(int)})
+    async for group in get_collection(TRANSACTIONS).aggregate(pipeline, allowDiskUse=True):
+        name = (group["_id"].get("merchant") or "").strip()
+        key = merchant_key(name)
+        if not key:
+            continue
+        merchant = merchants[(group["_id"]["userId"], key)]
+        merchant["spellings"][name] += group["count"]
+        merchant["count"] += group["count"]
+        merchant["categories"][encode_category(group["_id"]["category"])] += group["count"]
+
+    collection = get_collection(MERCHANTS)
+    updates = [
+        UpdateOne({"userId": owner, "merchantKey": key}, {"$set": {
+            # No order to tell the latest spelling by, so the most used one
+            "merchant": max(merchant["spellings"].items(), key=lambda item: item[1])[0],
+            "count": merchant["count"],
+            "categories": dict(merchant["categories"]),
+            "updated_at": started,
+        }}, upsert=True)
+        for (owner, key), merchant in merchants.items()
+    ]
+    for index in range(0, len(updates), 1000):
+        await collection.bulk_write(updates[index:index + 1000], ordered=False)
+    # Live writes stamp updated_at after `started`, so only merchants nothing touched are stale
+    await collection.delete_many({**scope, "updated_at": {"$lt": started}})
+    owners = {owner for owner, _ in merchants} | ({user_id} if user_id else set())
+    for owner in owners:
+        response_cache.invalidate(owner, "merchants")
+
+if __name__ == "__main__":
+    from app.indexes import ensure_indexes
+
+    parser = argparse.ArgumentParser(description="Rebuild the merchant suggestion index from transactions; stop transaction writes first")
+    parser.add_argument("--user", help="only rebuild this user's merchants")
+    args = parser.parse_args()
+
+    async def _main():
+        connect()
+        try:
+            await ensure_indexes()
+            await rebuild_merchants(args.user)
+        finally:
+            close()
+
+    asyncio.run(_main())
+    print("Merchant index rebuilt")
@@ -0,0 +1,229 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional, Tuple
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Requests slower than this are logged with their Mongo command breakdown
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+COMMAND_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+# Responses that stay open for as long as the client reads (event streams, exports); their
+# duration says nothing about request latency, so it isn't recorded or logged as slow
+STREAMING_MEDIA_TYPES = (b"text/event-stream", b"application/x-ndjson", b"text/csv")
+
+_lock = threading.Lock()
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: Tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with _lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, labels)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...], labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self._series = {}
+
+    def observe(self, value: float, *labels):
+        with _lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def summary(self, *labels) -> Tuple[int, float]:
+        """(count, sum) observed for one label combination"""
+        with _lock:
+            series = self._series.get(labels)
+            return (sum(series[0]), series[1]) if series else (0, 0.0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), labels + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Request latency by route", LATENCY_BUCKETS, ("method", "route", "status")
+)
+REQUEST_SIZE = Histogram("http_request_size_bytes", "Request body size by route", SIZE_BUCKETS, ("method", "route"))
+RESPONSE_SIZE = Histogram("http_response_size_bytes", "Response body size by route", SIZE_BUCKETS, ("method", "route"))
+MONGO_DURATION = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency by command", LATENCY_BUCKETS, ("command",)
+)
+MONGO_FAILURES = Counter("mongo_command_failures_total", "MongoDB commands that returned an error", ("command",))
+MONGO_COMMANDS_PER_REQUEST = Histogram(
+    "mongo_commands_per_request", "MongoDB commands issued while serving one request", COMMAND_COUNT_BUCKETS, ("method", "route")
+)
+MONGO_SECONDS_PER_REQUEST = Histogram(
+    "mongo_seconds_per_request", "Time spent in MongoDB commands while serving one request", LATENCY_BUCKETS, ("method", "route")
+)
+
+METRICS = (
+    REQUEST_DURATION,
+    REQUEST_SIZE,
+    RESPONSE_SIZE,
+    MONGO_DURATION,
+    MONGO_FAILURES,
+    MONGO_COMMANDS_PER_REQUEST,
+    MONGO_SECONDS_PER_REQUEST,
+)
+
+class RequestStats:
+    """Mongo commands attributed to the request being served, as {command: [count, seconds]}"""
+    __slots__ = ("commands",)
+
+    def __init__(self):
+        self.commands = {}
+
+    def record(self, command: str, seconds: float):
+        with _lock:
+            entry = self.commands.setdefault(command, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    @property
+    def count(self) -> int:
+        return sum(count for count, _ in self.commands.values())
+
+    @property
+    def seconds(self) -> float:
+        return sum(seconds for _, seconds in self.commands.values())
+
+    def breakdown(self) -> str:
+        return ", ".join(
+            f"{command} x{count} {seconds * 1000:.1f}ms"
+            for command, (count, seconds) in sorted(self.commands.items(), key=lambda item: -item[1][1])
+        )
+
+# Motor runs pymongo on executor threads with a copy of the caller's context, so the
+# listener sees the RequestStats of the request that issued the command
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Feeds command latency into the global histograms and the current request's stats"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event.command_name, event.duration_micros / 1_000_000)
+
+    def failed(self, event):
+        MONGO_FAILURES.inc(event.command_name)
+        self._record(event.command_name, event.duration_micros / 1_000_000)
+
+    @staticmethod
+    def _record(command: str, seconds: float):
+        MONGO_DURATION.observe(seconds, command)
+        stats = _current_request.get()
+        if stats is not None:
+            stats.record(command, seconds)
+
+command_listener = MongoCommandListener()
+
+class TimingMiddleware:
+    """ASGI middleware recording latency, payload sizes and Mongo usage per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        started = time.perf_counter()
+        status = 500
+        request_bytes = 0
+        response_bytes = 0
+        streaming = False
+
+        async def counting_receive():
+            nonlocal request_bytes
+            message = await receive()
+            request_bytes += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal status, response_bytes, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                content_type = dict(message.get("headers", ())).get(b"content-type", b"")
+                streaming = content_type.startswith(STREAMING_MEDIA_TYPES)
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            _current_request.reset(token)
+            elapsed = time.perf_counter() - started
+            method = scope["method"]
+            # Label by route template, not raw path, so ids don't blow up the series count
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            if not streaming:
+                REQUEST_DURATION.observe(elapsed, method, route, str(status))
+            REQUEST_SIZE.observe(request_bytes, method, route)
+            RESPONSE_SIZE.observe(response_bytes, method, route)
+            MONGO_COMMANDS_PER_REQUEST.observe(stats.count, method, route)
+            MONGO_SECONDS_PER_REQUEST.observe(stats.seconds, method, route)
+            if not streaming and elapsed * 1000 >= SLOW_REQUEST_MS:
+                logger.warning(
+                    "Slow request %s %s -> %s in %.1fms; mongo: %d commands %.1fms (%s)",
+                    method, scope["path"], status, elapsed * 1000,
+                    stats.count, stats.seconds * 1000, stats.breakdown() or "none",
+                )
+
+def render_metrics(cache_stats: Optional[dict] = None) -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for key, value in (cache_stats or {}).items():
+        name = "response_cache_" + "".join("_" + c.lower() if c.isupper() else c for c in key)
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
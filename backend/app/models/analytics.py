@@ -0,0 +1,49 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import datetime
+
+class CategoryTotal(BaseModel):
+    category: str
+    total: float
+    count: int
+
+class MonthlyTrend(BaseModel):
+    month: str # Format: "YYYY-MM"
+    total: float
+    count: int
+
+class CardSplit(BaseModel):
+    card_id: Optional[str] = Field(None, alias="cardId") # None for non-card payments
+    total: float
+    count: int
+
+    class Config:
+        populate_by_name = True
+
+class PaymentModeTotal(BaseModel):
+    payment_mode: Optional[str] = Field(None, alias="paymentMode")
+    total: float
+    count: int
+
+    class Config:
+        populate_by_name = True
+
+class MerchantTotal(BaseModel):
+    merchant: str
+    total: float
+    count: int
+
+class AnalyticsSummary(BaseModel):
+    user_id: str = Field(..., alias="userId")
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    total_spent: float = Field(0, alias="totalSpent")
+    transaction_count: int = Field(0, alias="transactionCount")
+    categories: List[CategoryTotal] = []
+    monthly: List[MonthlyTrend] = []
+    cards: List[CardSplit] = []
+    payment_modes: List[PaymentModeTotal] = Field(default_factory=list, alias="paymentModes")
+    top_merchants: List[MerchantTotal] = Field(default_factory=list, alias="topMerchants")
+
+    class Config:
+        populate_by_name = True
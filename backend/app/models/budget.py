@@ -22,3 +22,14 @@ class BudgetInDB(BudgetBase):
     class Config:
         populate_by_name = True
         arbitrary_types_allowed = True
+
+class BudgetUsage(BaseModel):
+    user_id: PyObjectId = Field(..., alias="userId")
+    month_year: str = Field(..., alias="monthYear")
+    total: float = 0
+    count: int = 0
+    categories: Dict[str, float] = Field(default_factory=dict)
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        populate_by_name = True
@@ -4,6 +4,9 @@ from datetime import datetime
 
 PyObjectId = Annotated[str, BeforeValidator(str)]
 
+# Onboarding stores "Credit Card", older clients send "credit"
+CREDIT_CARD_TYPES = ("credit", "Credit Card")
+
 class CardBase(BaseModel):
     user_id: PyObjectId = Field(..., alias="userId")
     card_type: str = Field(..., alias="cardType") # credit/debit
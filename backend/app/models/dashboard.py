@@ -0,0 +1,68 @@
+from pydantic import BaseModel, Field, BeforeValidator
+from typing import Optional, Annotated, List
+from datetime import datetime
+
+PyObjectId = Annotated[str, BeforeValidator(str)]
+
+class BankAccountSummary(BaseModel):
+    id: PyObjectId = Field(..., alias="_id")
+    bank_name: Optional[str] = Field(None, alias="bankName")
+    account_type: Optional[str] = Field(None, alias="accountType")
+    is_primary: bool = Field(False, alias="isPrimary")
+    balance: float = 0.0
+
+    class Config:
+        populate_by_name = True
+
+class CardSummary(BaseModel):
+    id: PyObjectId = Field(..., alias="_id")
+    card_type: Optional[str] = Field(None, alias="cardType")
+    card_name: Optional[str] = Field(None, alias="cardName")
+    bank_name: Optional[str] = Field(None, alias="bankName")
+    card_number: Optional[str] = Field(None, alias="cardNumber")
+    card_provider: Optional[str] = Field(None, alias="cardProvider")
+    card_status: Optional[str] = Field(None, alias="cardStatus")
+    credit_limit: Optional[float] = Field(None, alias="creditLimit")
+    current_outstanding: Optional[float] = Field(0, alias="currentOutstanding")
+    utilization: Optional[float] = None # Percentage, credit cards only
+
+    class Config:
+        populate_by_name = True
+
+class RecentTransaction(BaseModel):
+    id: PyObjectId = Field(..., alias="_id")
+    card_id: Optional[PyObjectId] = Field(None, alias="cardId")
+    date: datetime
+    merchant: str
+    amount: float
+    category: str
+    payment_mode: str = Field(..., alias="paymentMode")
+
+    class Config:
+        populate_by_name = True
+
+class BudgetProgress(BaseModel):
+    total_budget: float = Field(0, alias="totalBudget")
+    spent: float = 0
+    remaining: float = 0
+    used_percentage: float = Field(0, alias="usedPercentage")
+    savings_goal: Optional[float] = Field(0, alias="savingsGoal")
+
+    class Config:
+        populate_by_name = True
+
+class DashboardSummary(BaseModel):
+    user_id: str = Field(..., alias="userId")
+    month: str # Format: "YYYY-MM"
+    total_balance: float = Field(0, alias="totalBalance")
+    total_credit_limit: float = Field(0, alias="totalCreditLimit")
+    total_outstanding: float = Field(0, alias="totalOutstanding")
+    net_balance: float = Field(0, alias="netBalance")
+    credit_utilization: float = Field(0, alias="creditUtilization")
+    budget: Optional[BudgetProgress] = None
+    bank_accounts: List[BankAccountSummary] = Field(default_factory=list, alias="bankAccounts")
+    cards: List[CardSummary] = []
+    recent_transactions: List[RecentTransaction] = Field(default_factory=list, alias="recentTransactions")
+
+    class Config:
+        populate_by_name = True
@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+from typing import Optional
+
+class MerchantSuggestion(BaseModel):
+    merchant: str
+    category: Optional[str] = None # The category most often used with this merchant
+    count: int = 0
@@ -0,0 +1,26 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from app.models.user import PersonalInfo, EmploymentInfo, UserInDB
+from app.models.bank import BankAccountCreate, BankAccountInDB
+from app.models.card import CardCreate, CardInDB
+from app.models.budget import BudgetCreate, BudgetInDB
+
+class OnboardingPayload(BaseModel):
+    personal_info: Optional[PersonalInfo] = None
+    employment_info: Optional[EmploymentInfo] = None
+    bank_accounts: List[BankAccountCreate] = Field(default_factory=list, alias="bankAccounts")
+    cards: List[CardCreate] = Field(default_factory=list)
+    budget: Optional[BudgetCreate] = None
+
+    class Config:
+        populate_by_name = True
+
+class OnboardingResult(BaseModel):
+    user: UserInDB
+    bank_accounts: List[BankAccountInDB] = Field(default_factory=list, alias="bankAccounts")
+    cards: List[CardInDB] = Field(default_factory=list)
+    budget: Optional[BudgetInDB] = None
+    access_token: str # Reissued, as onboarding_completed is one of its claims
+
+    class Config:
+        populate_by_name = True
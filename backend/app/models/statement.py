@@ -0,0 +1,19 @@
+from pydantic import BaseModel, Field, BeforeValidator
+from typing import Optional, Annotated
+from datetime import date
+
+PyObjectId = Annotated[str, BeforeValidator(str)]
+
+class Statement(BaseModel):
+    card_id: PyObjectId = Field(..., alias="cardId")
+    user_id: Optional[PyObjectId] = Field(None, alias="userId")
+    cycle_start: date = Field(..., alias="cycleStart")
+    cycle_end: date = Field(..., alias="cycleEnd") # Closing (statement) day, inclusive
+    due_date: date = Field(..., alias="dueDate")
+    spend: float = 0
+    transaction_count: int = Field(0, alias="transactionCount")
+    minimum_due: float = Field(0, alias="minimumDue")
+    closed: bool = True # False for the cycle still open today
+
+    class Config:
+        populate_by_name = True
@@ -1,13 +1,21 @@
-from pydantic import BaseModel, Field, BeforeValidator
+from pydantic import BaseModel, Field, AfterValidator, BeforeValidator
 from typing import Optional, Annotated, List
-from datetime import datetime
+from datetime import datetime, timezone
 
 PyObjectId = Annotated[str, BeforeValidator(str)]
 
+def _naive_utc(value: datetime) -> datetime:
+    # Dates are stored as naive UTC ISO strings and compared as text, so offsets are folded in
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+UtcDatetime = Annotated[datetime, AfterValidator(_naive_utc)]
+
 class TransactionBase(BaseModel):
     user_id: PyObjectId = Field(..., alias="userId")
     card_id: Optional[PyObjectId] = Field(None, alias="cardId") # Link to card
-    date: datetime = Field(default_factory=datetime.now)
+    date: UtcDatetime = Field(default_factory=datetime.utcnow)
     merchant: str = Field(...)
     description: Optional[str] = None
     amount: float = Field(..., gt=0)
@@ -24,7 +32,7 @@ class TransactionUpdate(BaseModel):
     merchant: Optional[str] = None
     amount: Optional[float] = None
     category: Optional[str] = None
-    date: Optional[datetime] = None
+    date: Optional[UtcDatetime] = None
     notes: Optional[str] = None
     tags: Optional[List[str]] = None
 
@@ -36,3 +44,17 @@ class TransactionInDB(TransactionBase):
     class Config:
         populate_by_name = True
         arbitrary_types_allowed = True
+
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+class ImportReport(BaseModel):
+    imported: int = 0
+    duplicates: int = 0
+    failed: int = 0
+    errors: List[ImportRowError] = []
+    errors_truncated: bool = Field(False, alias="errorsTruncated")
+
+    class Config:
+        populate_by_name = True
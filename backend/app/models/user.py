@@ -9,7 +9,7 @@ class PersonalInfo(BaseModel):
     full_name: str = Field(..., min_length=3)
     phone_number: str = Field(..., pattern=r"^[0-9]{10}$")
     email: EmailStr
-    profile_photo: Optional[str] = None # Base64 string
+    profile_photo: Optional[str] = None # Base64 upload; moved to GridFS, never stored here
 
 class EmploymentInfo(BaseModel):
     status: str # Employed/Self-Employed/Unemployed/Student
@@ -46,6 +46,7 @@ class UserInDB(BaseModel):
     password: str  # Hashed
     personal_info: Optional[PersonalInfo] = None
     employment_info: Optional[EmploymentInfo] = None
+    profile_photo_url: Optional[str] = None
     onboarding_completed: bool = False
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -53,3 +54,19 @@ class UserInDB(BaseModel):
     class Config:
         populate_by_name = True
         arbitrary_types_allowed = True
+
+class LoginResponse(UserInDB):
+    password: Optional[str] = Field(default=None, exclude=True) # The hash never leaves the server
+    access_token: str
+    token_type: str = "bearer"
+
+class UserUpdated(UserInDB):
+    # Set when the update changed a claim the user's access token carries
+    access_token: Optional[str] = None
+
+class TokenClaims(BaseModel):
+    sub: PyObjectId # User id
+    email: EmailStr
+    name: str
+    onboarding_completed: bool = False
+    exp: int
@@ -0,0 +1,297 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.database import CARDS, CARD_OUTBOX, TRANSACTIONS, get_collection
+from app.cache import response_cache
+from app.events import publish, wants_events
+
+logger = logging.getLogger(__name__)
+
+# Set on a credit-card transaction until its amount has been added to the card
+PENDING_FIELD = "cardDeltaPending"
+# Journal entries are stamped with the flush applying them before the card is updated, and the
+# card keeps the ids of its recent flushes, so a retried or replayed flush never applies twice
+FLUSH_FIELD = "cardDeltaFlush"
+FLUSHED_AT_FIELD = "cardDeltaFlushedAt"
+APPLIED_FIELD = "appliedFlushes"
+APPLIED_HISTORY = 100
+
+# How long deltas are gathered before a flush, and how many cards force an early one
+FLUSH_WINDOW = float(os.getenv("CARD_OUTSTANDING_FLUSH_MS", "50")) / 1000
+MAX_PENDING_CARDS = int(os.getenv("CARD_OUTSTANDING_MAX_PENDING", "500"))
+# Journal entries younger than this may belong to another live worker, so replay leaves them
+REPLAY_GRACE = timedelta(seconds=30)
+# How often the worker sweeps the journal for entries a crashed or stopped worker left behind
+SWEEP_INTERVAL = float(os.getenv("CARD_OUTSTANDING_SWEEP_SECONDS", "60"))
+
+def _stale(flushed_at: str, cutoff: datetime) -> dict:
+    # Untouched since the cutoff: never flushed, or stamped by a flush that stopped retrying
+    return {"$or": [
+        {flushed_at: {"$lt": cutoff}},
+        {flushed_at: {"$exists": False}, "created_at": {"$lt": cutoff}},
+    ]}
+
+class _PendingCard:
+    __slots__ = ("card_id", "user_id", "delta", "transaction_ids", "outbox_ids", "flush_id")
+
+    def __init__(self, card_id: str, user_id: str):
+        self.card_id = card_id
+        self.user_id = user_id
+        self.delta = 0.0
+        self.transaction_ids = []
+        self.outbox_ids = []
+        # Assigned when a flush first tries the entry and kept across its retries
+        self.flush_id: Optional[ObjectId] = None
+
+    def update(self) -> UpdateOne:
+        """The card's $inc, skipped if this flush already reached the card"""
+        return UpdateOne(
+            {"_id": ObjectId(self.card_id), APPLIED_FIELD: {"$ne": self.flush_id}},
+            {
+                "$inc": {"currentOutstanding": round(self.delta, 2)},
+                "$push": {APPLIED_FIELD: {"$each": [self.flush_id], "$slice": -APPLIED_HISTORY}},
+            },
+        )
+
+class OutstandingQueue:
+    """Write-behind queue that merges per-card currentOutstanding deltas into one bulk_write.
+
+    Every queued delta is journaled before the request returns. A created transaction
+    carries PENDING_FIELD in the document it was inserted with, and a delete writes a
+    card_outbox entry. A flush stamps those entries with its id, applies the merged $inc
+    per card guarded by that id, then clears them. A card whose update failed is retried
+    under the same id; one whose journal wasn't cleared is only cleared again.
+    replay(), at startup and then periodically, re-queues what a crashed worker left
+    behind, skipping deltas whose stamped flush already reached the card.
+    With several workers, barrier() only sees this process's queue; the flush window
+    bounds how stale another worker's view can be.
+    Readers that need an exact balance call barrier() first.
+    """
+
+    def __init__(self, window: float = FLUSH_WINDOW, max_pending: int = MAX_PENDING_CARDS):
+        self.window = window
+        self.max_pending = max_pending
+        self._pending = {}
+        # Entries a failed flush left half done; retried before anything else, as they are
+        self._retry = []
+        self._in_flight = []
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.flushes = 0
+
+    async def add(self, card_id: str, user_id: str, delta: float, transaction_id=None, journal: bool = False):
+        """Queue a change to a card's outstanding; journal=True writes it to the outbox first"""
+        outbox_id = None
+        if journal:
+            result = await get_collection(CARD_OUTBOX).insert_one(
+                {"cardId": card_id, "userId": user_id, "delta": delta, "created_at": datetime.utcnow()}
+            )
+            outbox_id = result.inserted_id
+        self._queue(card_id, user_id, delta, transaction_id, outbox_id)
+        await self._kick()
+
+    async def add_transactions(self, transactions: list):
+        """Queue the card deltas of credit-card transactions inserted with PENDING_FIELD set"""
+        for doc in transactions:
+            if doc.get(PENDING_FIELD):
+                self._queue(doc["cardId"], doc["userId"], doc["amount"], transaction_id=doc["_id"])
+        await self._kick()
+
+    async def _kick(self):
+        if not self._pending:
+            return
+        if self._task is None:
+            # No worker (scripts, tests): behave like a synchronous write
+            await self.flush()
+        elif len(self._pending) >= self.max_pending:
+            await self.flush()
+        else:
+            self._wakeup.set()
+
+    def _queue(self, card_id: str, user_id: str, delta: float, transaction_id=None, outbox_id=None):
+        entry = self._pending.get(card_id)
+        if entry is None:
+            entry = self._pending[card_id] = _PendingCard(card_id, user_id)
+        entry.delta += delta
+        if transaction_id is not None:
+            entry.transaction_ids.append(transaction_id)
+        if outbox_id is not None:
+            entry.outbox_ids.append(outbox_id)
+
+    def _entries(self):
+        yield from self._pending.values()
+        yield from self._retry
+        yield from self._in_flight
+
+    def holds(self, transaction_id) -> bool:
+        """Whether this process has the transaction's own delta queued, in flight or waiting to be retried"""
+        return any(transaction_id in entry.transaction_ids for entry in self._entries())
+
+    def has_pending(self, user_id: Optional[str] = None, card_id: Optional[str] = None) -> bool:
+        return any(
+            (card_id is not None and entry.card_id == card_id) or (user_id is not None and entry.user_id == user_id)
+            for entry in self._entries()
+        )
+
+    async def barrier(self, user_id: Optional[str] = None, card_id: Optional[str] = None):
+        """Make sure every delta queued so far for this user or card has reached the cards collection"""
+        if self.has_pending(user_id, card_id):
+            await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending and not self._retry:
+                return
+            flush_id = ObjectId()
+            for entry in self._pending.values():
+                entry.flush_id = flush_id
+            self._in_flight = [*self._retry, *self._pending.values()]
+            self._retry, self._pending = [], {}
+            try:
+                self._retry = await self._write(self._in_flight)
+            except Exception:
+                # The outcome is unknown; every entry is retried under its flush id, so none applies twice
+                self._retry = self._in_flight
+                raise
+            finally:
+                self._in_flight = []
+            if self._retry:
+                self._wakeup.set()
+
+    async def _stamp(self, entries: list):
+        """Record on the journal entries which flush is applying them, for replay to check"""
+        now = datetime.utcnow()
+        for flush_id in {entry.flush_id for entry in entries}:
+            batch = [entry for entry in entries if entry.flush_id == flush_id]
+            transaction_ids = [tid for entry in batch for tid in entry.transaction_ids]
+            outbox_ids = [oid for entry in batch for oid in entry.outbox_ids]
+            if transaction_ids:
+                await get_collection(TRANSACTIONS).update_many(
+                    {"_id": {"$in": transaction_ids}}, {"$set": {FLUSH_FIELD: flush_id, FLUSHED_AT_FIELD: now}}
+                )
+            if outbox_ids:
+                await get_collection(CARD_OUTBOX).update_many(
+                    {"_id": {"$in": outbox_ids}}, {"$set": {"flushId": flush_id, "flushedAt": now}}
+                )
+
+    async def _write(self, entries: list) -> list:
+        """Apply the entries and clear their journal; returns the ones to retry"""
+        await self._stamp(entries)
+
+        changed = [entry for entry in entries if round(entry.delta, 2)]
+        failed = set()
+        if changed:
+            try:
+                await get_collection(CARDS).bulk_write([entry.update() for entry in changed], ordered=False)
+            except BulkWriteError as e:
+                failed = {id(changed[error["index"]]) for error in e.details.get("writeErrors", [])}
+                logger.error("%d of %d card outstanding updates failed", len(failed), len(changed))
+        applied = [entry for entry in entries if id(entry) not in failed]
+        retry = [entry for entry in entries if id(entry) in failed]
+
+        transaction_ids = [tid for entry in applied for tid in entry.transaction_ids]
+        outbox_ids = [oid for entry in applied for oid in entry.outbox_ids]
+        try:
+            if transaction_ids:
+                await get_collection(TRANSACTIONS).update_many(
+                    {"_id": {"$in": transaction_ids}}, {"$unset": {PENDING_FIELD: "", FLUSH_FIELD: "", FLUSHED_AT_FIELD: ""}}
+                )
+            if outbox_ids:
+                await get_collection(CARD_OUTBOX).delete_many({"_id": {"$in": outbox_ids}})
+        except Exception:
+            # The cards are updated; retrying only clears the journal, as their guarded $inc now misses
+            logger.exception("Clearing %d journaled card outstanding deltas failed", len(transaction_ids) + len(outbox_ids))
+            retry = entries
+
+        for user_id in {entry.user_id for entry in applied}:
+            response_cache.invalidate(user_id, "cards")
+        watched = [ObjectId(entry.card_id) for entry in applied if wants_events(entry.user_id)]
+        if watched:
+            async for card in get_collection(CARDS).find({"_id": {"$in": watched}}, {"userId": 1, "currentOutstanding": 1}):
+                publish(card["userId"], "card.outstanding", {"cardId": card["_id"], "currentOutstanding": card.get("currentOutstanding")})
+        self.flushes += 1
+        return retry
+
+    async def replay(self, grace: timedelta = REPLAY_GRACE):
+        """Queue the journaled deltas a previous or crashed process did not get to apply"""
+        cutoff = datetime.utcnow() - grace
+        # Entries this process still holds are its own to finish
+        held_transactions = {tid for entry in self._entries() for tid in entry.transaction_ids}
+        held_outbox = {oid for entry in self._entries() for oid in entry.outbox_ids}
+        found = []
+        async for doc in get_collection(TRANSACTIONS).find(
+            {PENDING_FIELD: True, **_stale(FLUSHED_AT_FIELD, cutoff)}, {"cardId": 1, "userId": 1, "amount": 1, FLUSH_FIELD: 1}
+        ):
+            if doc["_id"] not in held_transactions:
+                found.append((doc["cardId"], doc["userId"], doc["amount"], doc.get(FLUSH_FIELD), doc["_id"], None))
+        async for doc in get_collection(CARD_OUTBOX).find(_stale("flushedAt", cutoff)):
+            if doc["_id"] not in held_outbox:
+                found.append((doc["cardId"], doc["userId"], doc["delta"], doc.get("flushId"), None, doc["_id"]))
+        if not found:
+            return
+
+        # A stamped entry whose flush reached the card only needs its journal cleared
+        stamped = {(card_id, flush_id) for card_id, _, _, flush_id, _, _ in found if flush_id is not None}
+        applied = set()
+        if stamped:
+            cards = get_collection(CARDS).find(
+                {"_id": {"$in": [ObjectId(card_id) for card_id, _ in stamped]}}, {APPLIED_FIELD: 1}
+            )
+            async for card in cards:
+                applied.update((str(card["_id"]), flush_id) for flush_id in card.get(APPLIED_FIELD, []))
+        for card_id, user_id, delta, flush_id, transaction_id, outbox_id in found:
+            if (card_id, flush_id) in applied:
+                delta = 0.0
+            self._queue(card_id, user_id, delta, transaction_id=transaction_id, outbox_id=outbox_id)
+        logger.info("Replaying %d journaled card outstanding deltas", len(found))
+        await self.flush()
+
+    def start(self):
+        if self._task is None:
+            # Bind the primitives to the loop the app runs on
+            self._lock = asyncio.Lock()
+            self._wakeup = asyncio.Event()
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the worker once it has flushed everything queued"""
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        swept = asyncio.get_running_loop().time()
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=SWEEP_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            if asyncio.get_running_loop().time() - swept >= SWEEP_INTERVAL:
+                swept = asyncio.get_running_loop().time()
+                try:
+                    await self.replay()
+                except Exception:
+                    logger.exception("Sweeping the card outstanding journal failed")
+            if not self._wakeup.is_set() and not self._stopping:
+                continue
+            if not self._stopping:
+                # Let concurrent writes to the same cards pile up before flushing them together
+                await asyncio.sleep(self.window)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                await asyncio.sleep(1)
+
+outstanding_queue = OutstandingQueue()
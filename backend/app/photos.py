@@ -0,0 +1,128 @@
+import asyncio
+import base64
+import binascii
+import io
+import logging
+import os
+from typing import Optional, Tuple
+from bson import ObjectId
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from app.database import USERS, PROFILE_PHOTOS, connect, close, get_collection, get_database
+
+try:
+    from PIL import Image, ImageOps
+except ImportError: # Without Pillow photos are stored as uploaded, just size-checked
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Longest edge of the stored thumbnail, in pixels
+PHOTO_SIZE = int(os.getenv("PROFILE_PHOTO_SIZE", "256"))
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+
+# Magic bytes of the formats we accept
+_SIGNATURES = {
+    b"\xff\xd8\xff": "image/jpeg",
+    b"\x89PNG\r\n\x1a\n": "image/png",
+    b"GIF87a": "image/gif",
+    b"GIF89a": "image/gif",
+}
+
+def _sniff(data: bytes) -> Optional[str]:
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, content_type in _SIGNATURES.items():
+        if data.startswith(signature):
+            return content_type
+    return None
+
+def decode_data_url(value: str) -> bytes:
+    """Bytes of a `data:image/...;base64,` URL (or bare base64) as sent by the onboarding form"""
+    if value.startswith("data:"):
+        header, _, value = value.partition(",")
+        if ";base64" not in header:
+            raise ValueError("Profile photo must be base64 encoded")
+    try:
+        return base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("Profile photo is not valid base64")
+
+def make_thumbnail(data: bytes) -> Tuple[bytes, str]:
+    """Downscale an uploaded image to PHOTO_SIZE and return (bytes, content type)"""
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise ValueError(f"Profile photo must be under {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+    content_type = _sniff(data)
+    if content_type is None:
+        raise ValueError("Profile photo must be a JPEG, PNG, GIF or WebP image")
+    if Image is None:
+        return data, content_type
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((PHOTO_SIZE, PHOTO_SIZE))
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            output = io.BytesIO()
+            image.save(output, format="JPEG", quality=85, optimize=True)
+    except (OSError, Image.DecompressionBombError):
+        raise ValueError("Profile photo could not be read as an image")
+    return output.getvalue(), "image/jpeg"
+
+def photo_url(user_id: str, photo_id) -> str:
+    return f"/api/user/{user_id}/photo/{photo_id}"
+
+def _bucket() -> AsyncIOMotorGridFSBucket:
+    return AsyncIOMotorGridFSBucket(get_database(), bucket_name=PROFILE_PHOTOS)
+
+async def save_photo(user_id: str, data: bytes) -> str:
+    """Store a thumbnail of the image in GridFS, drop the user's older photos and return its URL"""
+    # Decoding and resizing a multi-megabyte image would stall the event loop; do it on a thread
+    thumbnail, content_type = await asyncio.get_running_loop().run_in_executor(None, make_thumbnail, data)
+    bucket = _bucket()
+    photo_id = await bucket.upload_from_stream(
+        user_id, thumbnail, metadata={"userId": user_id, "contentType": content_type}
+    )
+    files = get_collection(f"{PROFILE_PHOTOS}.files")
+    async for old in files.find({"metadata.userId": user_id, "_id": {"$ne": photo_id}}, {"_id": 1}):
+        await bucket.delete(old["_id"])
+    return photo_url(user_id, photo_id)
+
+async def load_photo(user_id: str, photo_id: str) -> Optional[Tuple[bytes, str]]:
+    """(bytes, content type) of a stored photo, or None if it doesn't exist or isn't the user's"""
+    if not ObjectId.is_valid(photo_id):
+        return None
+    try:
+        stream = await _bucket().open_download_stream(ObjectId(photo_id))
+    except NoFile:
+        return None
+    metadata = stream.metadata or {}
+    if metadata.get("userId") != user_id:
+        return None
+    return await stream.read(), metadata.get("contentType", "application/octet-stream")
+
+async def migrate_inline_photos() -> int:
+    """Move base64 photos still embedded in user documents into GridFS"""
+    users = get_collection(USERS)
+    moved = 0
+    async for user in users.find({"personal_info.profile_photo": {"$type": "string"}}, {"personal_info.profile_photo": 1}):
+        user_id = str(user["_id"])
+        update = {"$unset": {"personal_info.profile_photo": ""}}
+        try:
+            update["$set"] = {"profile_photo_url": await save_photo(user_id, decode_data_url(user["personal_info"]["profile_photo"]))}
+            moved += 1
+        except ValueError as exc:
+            logger.warning("Dropping unreadable profile photo of user %s: %s", user_id, exc)
+        await users.update_one({"_id": user["_id"]}, update)
+    return moved
+
+if __name__ == "__main__":
+    async def _main():
+        connect()
+        try:
+            print(f"Moved {await migrate_inline_photos()} profile photos to GridFS")
+        finally:
+            close()
+
+    asyncio.run(_main())
@@ -0,0 +1,96 @@
+from fastapi import HTTPException, Query
+from typing import Optional
+from datetime import datetime, timezone
+from bson import ObjectId
+from bson.errors import InvalidId
+import base64
+import json
+
+def stored_date(value: datetime) -> str:
+    """Transactions are written through jsonable_encoder, so dates are naive UTC ISO strings"""
+    # An offset in the parameter ("...+05:30") would otherwise compare as text against naive dates
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+def transaction_filters(
+    category: Optional[str] = Query(None),
+    payment_mode: Optional[str] = Query(None, alias="paymentMode"),
+    card: Optional[str] = Query(None, alias="cardId"),
+    min_amount: Optional[float] = Query(None, alias="minAmount", ge=0),
+    max_amount: Optional[float] = Query(None, alias="maxAmount", ge=0),
+    start: Optional[datetime] = Query(None, description="Inclusive lower bound on transaction date"),
+    end: Optional[datetime] = Query(None, description="Exclusive upper bound on transaction date"),
+) -> dict:
+    """Build a Mongo filter from the optional listing query parameters"""
+    query = {}
+    if category:
+        query["category"] = category
+    if payment_mode:
+        query["paymentMode"] = payment_mode
+    if card:
+        query["cardId"] = card
+
+    amount = {}
+    if min_amount is not None:
+        amount["$gte"] = min_amount
+    if max_amount is not None:
+        amount["$lte"] = max_amount
+    if amount:
+        query["amount"] = amount
+
+    date_range = {}
+    if start:
+        date_range["$gte"] = stored_date(start)
+    if end:
+        date_range["$lt"] = stored_date(end)
+    if date_range:
+        query["date"] = date_range
+
+    return query
+
+def encode_cursor(doc: dict) -> str:
+    """Opaque token for the (date, _id) position of the last document on a page"""
+    date = doc.get("date")
+    payload = {"i": str(doc["_id"])}
+    if isinstance(date, datetime):
+        payload["dt"] = date.isoformat()
+    else:
+        payload["d"] = date
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def cursor_position(token: str) -> tuple:
+    """(date, _id) of the last document on the page a cursor token was issued for"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        last_id = ObjectId(payload["i"])
+        date = datetime.fromisoformat(payload["dt"]) if "dt" in payload else payload["d"]
+        # Anything but a string would be spliced into the filter, e.g. an object as an operator
+        if not isinstance(date, (str, datetime)):
+            raise TypeError(date)
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return date, last_id
+
+def decode_cursor(token: str) -> dict:
+    """Turn a cursor token into a keyset condition for a (date desc, _id desc) sort"""
+    date, last_id = cursor_position(token)
+    return {"$or": [
+        {"date": {"$lt": date}},
+        {"date": date, "_id": {"$lt": last_id}},
+    ]}
+
+def month_key(value: datetime) -> str:
+    """Budget month key, "YYYY-MM" as written by the onboarding flow"""
+    return value.strftime("%Y-%m")
+
+def month_bounds(month: str) -> dict:
+    """Date filter covering one "YYYY-MM" month of stored transaction dates"""
+    try:
+        start = datetime.strptime(month, "%Y-%m")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid month {month}, expected YYYY-MM")
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return {"$gte": stored_date(start), "$lt": stored_date(end)}
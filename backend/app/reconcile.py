@@ -0,0 +1,173 @@
+import argparse
+import asyncio
+import json
+from datetime import datetime
+from typing import Optional
+from bson import ObjectId
+from pymongo import UpdateOne
+from app.database import CARDS, CARD_OUTBOX, JOB_CHECKPOINTS, TRANSACTIONS, connect, close, get_collection
+from app.models.card import CREDIT_CARD_TYPES
+from app.outstanding import PENDING_FIELD
+from app.cold_storage import hot_only, with_cold_tier
+
+CHECKPOINT_ID = "reconcile_outstanding"
+CHUNK_SIZE = 500
+MAX_SAMPLES = 50
+
+def _expected_pipeline(card_ids: list) -> list:
+    """Applied credit-card spend per card, plus how many deltas are still queued"""
+    match = {"cardId": {"$in": card_ids}, "paymentMode": "Credit Card"}
+    return [
+        {"$match": hot_only(match)},
+        with_cold_tier(match),
+        {"$group": {
+            "_id": "$cardId",
+            "total": {"$sum": {"$cond": [{"$eq": [f"${PENDING_FIELD}", True]}, 0, "$amount"]}},
+            "pending": {"$sum": {"$cond": [{"$eq": [f"${PENDING_FIELD}", True]}, 1, 0]}},
+        }},
+    ]
+
+async def _cards_with_outbox(card_ids: list) -> set:
+    """Cards with queued reversals of deleted transactions that their balance still includes"""
+    return set(await get_collection(CARD_OUTBOX).distinct("cardId", {"cardId": {"$in": card_ids}}))
+
+async def _load_checkpoint(restart: bool) -> Optional[dict]:
+    checkpoints = get_collection(JOB_CHECKPOINTS)
+    if restart:
+        await checkpoints.delete_one({"_id": CHECKPOINT_ID})
+        return None
+    return await checkpoints.find_one({"_id": CHECKPOINT_ID, "finished_at": None})
+
+async def _save_checkpoint(report: dict, last_card_id: str, finished: bool = False):
+    await get_collection(JOB_CHECKPOINTS).replace_one(
+        {"_id": CHECKPOINT_ID},
+        {
+            "lastCardId": last_card_id,
+            "report": report,
+            "updated_at": datetime.utcnow(),
+            "finished_at": datetime.utcnow() if finished else None,
+        },
+        upsert=True,
+    )
+
+async def reconcile_outstanding(dry_run: bool = False, chunk_size: int = CHUNK_SIZE, restart: bool = False) -> dict:
+    """Recompute every credit card's outstanding from its transactions and fix the ones that drifted.
+
+    Expected = openingOutstanding + the card's credit-card transactions. Cards are read a chunk at
+    a time and only then is their spend aggregated, so a delta flushed in between is already in
+    the total, and one flushed later changes the balance the fix is conditional on, making the fix
+    miss instead of overwriting it. Cards with deltas still journaled for the write-behind queue
+    are skipped. Progress is checkpointed every chunk, and an interrupted run resumes after the
+    last card done.
+    """
+    checkpoint = None if dry_run else await _load_checkpoint(restart)
+    report = checkpoint["report"] if checkpoint else {
+        "cardsChecked": 0,
+        "mismatched": 0,
+        "fixed": 0,
+        "skippedPending": 0,
+        "skippedConcurrent": 0,
+        "baselinesAdopted": 0,
+        "totalDrift": 0.0,
+        "samples": [],
+    }
+    report["dryRun"] = dry_run
+    report["resumedFrom"] = checkpoint["lastCardId"] if checkpoint else None
+    after = checkpoint["lastCardId"] if checkpoint else None
+
+    card_query = {"cardType": {"$in": list(CREDIT_CARD_TYPES)}}
+    if after:
+        card_query["_id"] = {"$gt": ObjectId(after)}
+
+    fixes = []
+    baselines = []
+    last_card_id = after
+
+    async def flush_chunk():
+        if not dry_run:
+            if fixes:
+                result = await get_collection(CARDS).bulk_write(fixes, ordered=False)
+                report["fixed"] += result.modified_count
+                report["skippedConcurrent"] += len(fixes) - result.matched_count
+            if baselines:
+                await get_collection(CARDS).bulk_write(baselines, ordered=False)
+            if last_card_id:
+                await _save_checkpoint(report, last_card_id)
+        fixes.clear()
+        baselines.clear()
+
+    while True:
+        chunk = await get_collection(CARDS).find(
+            card_query, {"userId": 1, "currentOutstanding": 1, "openingOutstanding": 1}
+        ).sort("_id", 1).limit(chunk_size).to_list(None)
+        if not chunk:
+            break
+        card_query["_id"] = {"$gt": chunk[-1]["_id"]}
+        # One query per chunk instead of per card, read after the balances it is compared with
+        card_ids = [str(card["_id"]) for card in chunk]
+        outbox = await _cards_with_outbox(card_ids)
+        spend = {
+            group["_id"]: group
+            async for group in get_collection(TRANSACTIONS).aggregate(_expected_pipeline(card_ids), allowDiskUse=True)
+        }
+        for card in chunk:
+            card_id = str(card["_id"])
+            matched = spend.get(card_id)
+            total = matched["total"] if matched else 0.0
+            report["cardsChecked"] += 1
+            last_card_id = card_id
+
+            if (matched and matched["pending"]) or card_id in outbox:
+                report["skippedPending"] += 1
+                continue
+
+            current = card.get("currentOutstanding") or 0.0
+            opening = card.get("openingOutstanding")
+            if opening is None:
+                # Cards created before the baseline was recorded: trust today's balance as the starting point
+                report["baselinesAdopted"] += 1
+                baselines.append(UpdateOne(
+                    {"_id": card["_id"], "openingOutstanding": None},
+                    {"$set": {"openingOutstanding": round(current - total, 2)}},
+                ))
+            else:
+                expected = round(opening + total, 2)
+                drift = round(current - expected, 2)
+                if drift:
+                    report["mismatched"] += 1
+                    report["totalDrift"] = round(report["totalDrift"] + drift, 2)
+                    if len(report["samples"]) < MAX_SAMPLES:
+                        report["samples"].append({
+                            "cardId": card_id,
+                            "userId": card.get("userId"),
+                            "current": current,
+                            "expected": expected,
+                            "drift": drift,
+                        })
+                    fixes.append(UpdateOne(
+                        {"_id": card["_id"], "currentOutstanding": card.get("currentOutstanding")},
+                        {"$set": {"currentOutstanding": expected}},
+                    ))
+        # Checkpoint every chunk of cards even when they need no fixes
+        await flush_chunk()
+
+    if not dry_run and last_card_id:
+        await _save_checkpoint(report, last_card_id, finished=True)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute credit card outstanding balances from transactions")
+    parser.add_argument("--dry-run", action="store_true", help="report drift without changing anything")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="cards read and fixed per batch")
+    parser.add_argument("--restart", action="store_true", help="ignore an unfinished previous run's checkpoint")
+    args = parser.parse_args()
+
+    async def _main():
+        connect()
+        try:
+            report = await reconcile_outstanding(args.dry_run, args.chunk_size, args.restart)
+            print(json.dumps(report, indent=2))
+        finally:
+            close()
+
+    asyncio.run(_main())
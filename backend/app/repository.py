@@ -0,0 +1,42 @@
+from typing import Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+async def insert_document(collection, document: dict, session=None) -> dict:
+    """Insert and return the document as stored, without reading it back"""
+    result = await collection.insert_one(document, session=session)
+    document["_id"] = result.inserted_id
+    return document
+
+async def insert_documents(collection, documents: list, session=None) -> list:
+    """Insert many in one round trip and return them with their new ids"""
+    if documents:
+        result = await collection.insert_many(documents, session=session)
+        for document, inserted_id in zip(documents, result.inserted_ids):
+            document["_id"] = inserted_id
+    return documents
+
+async def update_document(collection, query: dict, update: dict, projection: Optional[dict] = None, session=None) -> Optional[dict]:
+    """Apply an update and return the document after it, or None if nothing matched"""
+    return await collection.find_one_and_update(
+        query, update, projection=projection, return_document=ReturnDocument.AFTER, session=session
+    )
+
+async def upsert_document(collection, query: dict, fields: dict, on_insert: Optional[dict] = None, session=None) -> dict:
+    """Set fields on the matching document, creating it if needed, and return the result"""
+    update = {"$set": fields}
+    if on_insert:
+        update["$setOnInsert"] = on_insert
+    try:
+        return await collection.find_one_and_update(
+            query, update, upsert=True, return_document=ReturnDocument.AFTER, session=session
+        )
+    except DuplicateKeyError:
+        if session is not None and session.in_transaction:
+            raise # The transaction is aborted; let the caller retry it as a whole
+        # Lost an upsert race on a unique index; the other writer created it, so update that one
+        return await collection.find_one_and_update(query, {"$set": fields}, return_document=ReturnDocument.AFTER)
+
+async def delete_document(collection, query: dict, projection: Optional[dict] = None) -> Optional[dict]:
+    """Delete and return the removed document, or None if nothing matched"""
+    return await collection.find_one_and_delete(query, projection=projection)
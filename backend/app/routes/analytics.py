@@ -0,0 +1,103 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from motor.motor_asyncio import AsyncIOMotorCollection
+from typing import Optional
+from app.models.analytics import AnalyticsSummary
+from app.database import get_reporting_transaction_collection
+from app.queries import stored_date
+from app.cold_storage import hot_only, with_cold_tier
+from datetime import datetime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+router = APIRouter()
+
+def _group_totals(key) -> dict:
+    return {"_id": key, "total": {"$sum": "$amount"}, "count": {"$sum": 1}}
+
+def _build_pipeline(match: dict, tz: str, top: int) -> list:
+    return [
+        {"$match": hot_only(match)},
+        with_cold_tier(match),
+        {"$project": {
+            "_id": 0,
+            "amount": 1,
+            "category": 1,
+            "cardId": 1,
+            "merchant": 1,
+            "paymentMode": 1,
+            "date": {"$toDate": "$date"},
+        }},
+        {"$facet": {
+            "totals": [{"$group": _group_totals(None)}],
+            "categories": [
+                {"$group": _group_totals("$category")},
+                {"$sort": {"total": -1}},
+                {"$project": {"_id": 0, "category": "$_id", "total": {"$round": ["$total", 2]}, "count": 1}},
+            ],
+            "monthly": [
+                {"$group": _group_totals({"$dateTrunc": {"date": "$date", "unit": "month", "timezone": tz}})},
+                {"$sort": {"_id": 1}},
+                {"$project": {
+                    "_id": 0,
+                    "month": {"$dateToString": {"date": "$_id", "format": "%Y-%m", "timezone": tz}},
+                    "total": {"$round": ["$total", 2]},
+                    "count": 1,
+                }},
+            ],
+            "cards": [
+                {"$group": _group_totals("$cardId")},
+                {"$sort": {"total": -1}},
+                {"$project": {"_id": 0, "cardId": "$_id", "total": {"$round": ["$total", 2]}, "count": 1}},
+            ],
+            "paymentModes": [
+                {"$group": _group_totals("$paymentMode")},
+                {"$sort": {"total": -1}},
+                {"$project": {"_id": 0, "paymentMode": "$_id", "total": {"$round": ["$total", 2]}, "count": 1}},
+            ],
+            "topMerchants": [
+                {"$group": _group_totals("$merchant")},
+                {"$sort": {"total": -1}},
+                {"$limit": top},
+                {"$project": {"_id": 0, "merchant": "$_id", "total": {"$round": ["$total", 2]}, "count": 1}},
+            ],
+        }},
+    ]
+
+@router.get("/analytics/{user_id}", response_description="Spending analytics for a user", response_model=AnalyticsSummary)
+async def get_analytics(
+    user_id: str,
+    start: Optional[datetime] = Query(None, description="Inclusive lower bound on transaction date"),
+    end: Optional[datetime] = Query(None, description="Exclusive upper bound on transaction date"),
+    tz: str = Query("UTC", description="IANA timezone used to bucket months"),
+    top: int = Query(10, ge=1, le=50, description="Number of top merchants to return"),
+    transaction_collection: AsyncIOMotorCollection = Depends(get_reporting_transaction_collection),
+):
+    try:
+        ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown timezone {tz}")
+
+    match = {"userId": user_id}
+    date_range = {}
+    if start:
+        date_range["$gte"] = stored_date(start)
+    if end:
+        date_range["$lt"] = stored_date(end)
+    if date_range:
+        match["date"] = date_range
+
+    result = await transaction_collection.aggregate(_build_pipeline(match, tz, top)).to_list(1)
+    facets = result[0] if result else {}
+    totals = facets.get("totals") or [{"total": 0, "count": 0}]
+
+    return AnalyticsSummary(
+        userId=user_id,
+        start=start,
+        end=end,
+        totalSpent=round(totals[0]["total"], 2),
+        transactionCount=totals[0]["count"],
+        categories=facets.get("categories", []),
+        monthly=facets.get("monthly", []),
+        cards=facets.get("cards", []),
+        paymentModes=facets.get("paymentModes", []),
+        topMerchants=facets.get("topMerchants", []),
+    )
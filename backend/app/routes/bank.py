@@ -1,31 +1,43 @@
-from fastapi import APIRouter, Body, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Request, status
 from fastapi.encoders import jsonable_encoder
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pydantic import TypeAdapter
 from typing import List
 from app.models.bank import BankAccountCreate, BankAccountUpdate, BankAccountInDB
-from app.database import bank_collection
+from app.database import get_bank_collection
+from app.cache import cached_json, response_cache
+from app.repository import insert_document, delete_document
+from app.events import publish
 from datetime import datetime
 from bson import ObjectId
 
 router = APIRouter()
 
+_accounts_adapter = TypeAdapter(List[BankAccountInDB])
+
 @router.post("/bank-accounts", response_description="Add new bank account", response_model=BankAccountInDB)
-async def create_bank_account(account: BankAccountCreate = Body(...)):
+async def create_bank_account(account: BankAccountCreate = Body(...), bank_collection: AsyncIOMotorCollection = Depends(get_bank_collection)):
     account = jsonable_encoder(account)
     account["created_at"] = datetime.utcnow()
     account["updated_at"] = datetime.utcnow()
     
-    new_account = await bank_collection.insert_one(account)
-    created_account = await bank_collection.find_one({"_id": new_account.inserted_id})
+    created_account = await insert_document(bank_collection, account)
+    response_cache.invalidate(account["userId"], "bank_accounts")
+    publish(account["userId"], "bank.created", created_account)
     return created_account
 
 @router.get("/bank-accounts/{user_id}", response_description="List all bank accounts for a user", response_model=List[BankAccountInDB])
-async def list_bank_accounts(user_id: str):
-    accounts = await bank_collection.find({"userId": user_id}).to_list(100)
-    return accounts
+async def list_bank_accounts(user_id: str, request: Request, bank_collection: AsyncIOMotorCollection = Depends(get_bank_collection)):
+    async def load():
+        accounts = await bank_collection.find({"userId": user_id}).to_list(100)
+        return _accounts_adapter.dump_json(_accounts_adapter.validate_python(accounts), by_alias=True)
+    return await cached_json(request, (user_id, "bank_accounts"), load)
 
 @router.delete("/bank-accounts/{id}", response_description="Delete a bank account")
-async def delete_bank_account(id: str):
-    delete_result = await bank_collection.delete_one({"_id": ObjectId(id)})
-    if delete_result.deleted_count == 1:
+async def delete_bank_account(id: str, bank_collection: AsyncIOMotorCollection = Depends(get_bank_collection)):
+    deleted = await delete_document(bank_collection, {"_id": ObjectId(id)}, projection={"userId": 1})
+    if deleted is not None:
+        response_cache.invalidate(deleted["userId"], "bank_accounts")
+        publish(deleted["userId"], "bank.deleted", deleted)
         return {"message": "Bank account deleted"}
     raise HTTPException(status_code=404, detail=f"Bank account {id} not found")
@@ -1,38 +1,49 @@
-from fastapi import APIRouter, Body, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Request, status
 from fastapi.encoders import jsonable_encoder
-from app.models.budget import BudgetCreate, BudgetInDB
-from app.database import budget_collection
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pydantic import TypeAdapter
+from app.models.budget import BudgetCreate, BudgetInDB, BudgetUsage
+from app.database import get_budget_collection, get_budget_usage_collection
+from app.budget_usage import decode_category
+from app.cache import cached_json, response_cache
+from app.repository import upsert_document
+from app.events import publish
 from datetime import datetime
 from bson import ObjectId
 
 router = APIRouter()
 
+_budget_adapter = TypeAdapter(BudgetInDB)
+
 @router.post("/budgets", response_description="Set monthly budget", response_model=BudgetInDB)
-async def create_budget(budget: BudgetCreate = Body(...)):
+async def create_budget(budget: BudgetCreate = Body(...), budget_collection: AsyncIOMotorCollection = Depends(get_budget_collection)):
     budget = jsonable_encoder(budget)
-    budget["created_at"] = datetime.utcnow()
-    budget["updated_at"] = datetime.utcnow()
-    
-    # Check if budget for this month exists, if so update/replace
-    existing = await budget_collection.find_one({
-        "userId": budget["userId"],
-        "monthYear": budget["monthYear"]
-    })
+    now = datetime.utcnow()
+    budget["updated_at"] = now
     
-    if existing:
-        updated_budget = await budget_collection.find_one_and_update(
-            {"_id": existing["_id"]},
-            {"$set": budget},
-            return_document=True
-        )
-        return updated_budget
-
-    new_budget = await budget_collection.insert_one(budget)
-    created_budget = await budget_collection.find_one({"_id": new_budget.inserted_id})
-    return created_budget
+    # One budget per month: replace the existing one or create it
+    saved_budget = await upsert_document(
+        budget_collection,
+        {"userId": budget["userId"], "monthYear": budget["monthYear"]},
+        budget,
+        on_insert={"created_at": now},
+    )
+    response_cache.invalidate(budget["userId"], "budget")
+    publish(budget["userId"], "budget.updated", saved_budget)
+    return saved_budget
 
 @router.get("/budgets/{user_id}/{month_year}", response_description="Get budget", response_model=BudgetInDB)
-async def get_budget(user_id: str, month_year: str):
-    if (budget := await budget_collection.find_one({"userId": user_id, "monthYear": month_year})) is not None:
-        return budget
-    raise HTTPException(status_code=404, detail="Budget not found")
+async def get_budget(user_id: str, month_year: str, request: Request, budget_collection: AsyncIOMotorCollection = Depends(get_budget_collection)):
+    async def load():
+        if (budget := await budget_collection.find_one({"userId": user_id, "monthYear": month_year})) is not None:
+            return _budget_adapter.dump_json(_budget_adapter.validate_python(budget), by_alias=True)
+        raise HTTPException(status_code=404, detail="Budget not found")
+    return await cached_json(request, (user_id, "budget", month_year), load)
+
+@router.get("/budgets/{user_id}/{month_year}/usage", response_description="Get spent amounts for a month", response_model=BudgetUsage)
+async def get_budget_usage(user_id: str, month_year: str, budget_usage_collection: AsyncIOMotorCollection = Depends(get_budget_usage_collection)):
+    usage = await budget_usage_collection.find_one({"userId": user_id, "monthYear": month_year}, {"_id": 0})
+    if usage is None:
+        return BudgetUsage(userId=user_id, monthYear=month_year)
+    usage["categories"] = {decode_category(k): v for k, v in usage.get("categories", {}).items()}
+    return usage
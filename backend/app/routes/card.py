@@ -1,30 +1,64 @@
-from fastapi import APIRouter, Body, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, status
 from fastapi.encoders import jsonable_encoder
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pydantic import TypeAdapter
 from typing import List
-from app.models.card import CardCreate, CardUpdate, CardInDB
-from app.database import card_collection
+from app.models.card import CardCreate, CardUpdate, CardInDB, CREDIT_CARD_TYPES
+from app.models.statement import Statement
+from app.database import get_card_collection
+from app.cache import cached_json, response_cache
+from app.repository import insert_document
+from app.outstanding import outstanding_queue
+from app.billing import card_statements
+from app.events import publish
 from datetime import datetime
 from bson import ObjectId
 
 router = APIRouter()
 
+_cards_adapter = TypeAdapter(List[CardInDB])
+
 @router.post("/cards", response_description="Add new card", response_model=CardInDB)
-async def create_card(card: CardCreate = Body(...)):
+async def create_card(card: CardCreate = Body(...), card_collection: AsyncIOMotorCollection = Depends(get_card_collection)):
     card = jsonable_encoder(card)
     card["created_at"] = datetime.utcnow()
     card["isActive"] = True
+    # Starting balance the reconcile job adds transactions to
+    card["openingOutstanding"] = card.get("currentOutstanding") or 0
     
-    new_card = await card_collection.insert_one(card)
-    created_card = await card_collection.find_one({"_id": new_card.inserted_id})
+    created_card = await insert_document(card_collection, card)
+    response_cache.invalidate(card["userId"], "cards")
+    publish(card["userId"], "card.created", created_card)
     return created_card
 
 @router.get("/cards/{user_id}", response_description="List all cards for a user", response_model=List[CardInDB], response_model_by_alias=True)
-async def list_cards(user_id: str):
-    cards = await card_collection.find({"userId": user_id}).to_list(100)
-    return cards
+async def list_cards(user_id: str, request: Request, card_collection: AsyncIOMotorCollection = Depends(get_card_collection)):
+    # Balances must include transactions still in the write-behind queue
+    await outstanding_queue.barrier(user_id=user_id)
+    async def load():
+        cards = await card_collection.find({"userId": user_id}).to_list(100)
+        return _cards_adapter.dump_json(_cards_adapter.validate_python(cards), by_alias=True)
+    return await cached_json(request, (user_id, "cards"), load)
 
 @router.get("/cards/detail/{card_id}", response_description="Get single card", response_model=CardInDB)
-async def get_card(card_id: str):
+async def get_card(card_id: str, card_collection: AsyncIOMotorCollection = Depends(get_card_collection)):
+    await outstanding_queue.barrier(card_id=card_id)
     if (card := await card_collection.find_one({"_id": ObjectId(card_id)})) is not None:
         return card
     raise HTTPException(status_code=404, detail=f"Card {card_id} not found")
+
+@router.get("/cards/{card_id}/statements", response_description="Billing cycle statements of a credit card, open cycle first", response_model=List[Statement])
+async def list_statements(
+    card_id: str,
+    limit: int = Query(12, ge=1, le=60),
+    card_collection: AsyncIOMotorCollection = Depends(get_card_collection),
+):
+    card = await card_collection.find_one(
+        {"_id": ObjectId(card_id)},
+        {"userId": 1, "cardType": 1, "billingDate": 1, "dueDate": 1, "minDuePercentage": 1},
+    )
+    if card is None:
+        raise HTTPException(status_code=404, detail=f"Card {card_id} not found")
+    if card.get("cardType") not in CREDIT_CARD_TYPES or not card.get("billingDate"):
+        raise HTTPException(status_code=400, detail="Statements need a credit card with a billing date")
+    return await card_statements(card, limit)
@@ -0,0 +1,94 @@
+from fastapi import APIRouter, Depends, Query
+from motor.motor_asyncio import AsyncIOMotorCollection
+from typing import Optional
+from app.models.card import CREDIT_CARD_TYPES
+from app.models.dashboard import DashboardSummary, BudgetProgress
+from app.database import (
+    get_bank_collection,
+    get_card_collection,
+    get_transaction_collection,
+    get_budget_collection,
+    get_budget_usage_collection,
+)
+from app.queries import month_key, month_bounds
+from app.outstanding import outstanding_queue
+from app.cold_storage import hot_only, merge_cold
+from datetime import datetime
+import asyncio
+
+router = APIRouter()
+
+BANK_PROJECTION = {"bankName": 1, "accountType": 1, "isPrimary": 1, "balance": 1}
+CARD_PROJECTION = {
+    "cardType": 1, "cardName": 1, "bankName": 1, "cardNumber": 1, "cardProvider": 1,
+    "cardStatus": 1, "creditLimit": 1, "currentOutstanding": 1,
+}
+BUDGET_PROJECTION = {"_id": 0, "totalBudget": 1, "savingsGoal": 1}
+RECENT_PROJECTION = {"cardId": 1, "date": 1, "merchant": 1, "amount": 1, "category": 1, "paymentMode": 1}
+
+def _percentage(part: float, whole: float) -> float:
+    return round(part / whole * 100, 2) if whole else 0
+
+@router.get("/dashboard/{user_id}", response_description="Everything the dashboard needs in one call", response_model=DashboardSummary)
+async def get_dashboard(
+    user_id: str,
+    month: Optional[str] = Query(None, description="Budget month as YYYY-MM, defaults to the current month"),
+    recent: int = Query(5, ge=1, le=20, description="Number of recent transactions to include"),
+    bank_collection: AsyncIOMotorCollection = Depends(get_bank_collection),
+    card_collection: AsyncIOMotorCollection = Depends(get_card_collection),
+    transaction_collection: AsyncIOMotorCollection = Depends(get_transaction_collection),
+    budget_collection: AsyncIOMotorCollection = Depends(get_budget_collection),
+    budget_usage_collection: AsyncIOMotorCollection = Depends(get_budget_usage_collection),
+):
+    month = month or month_key(datetime.utcnow())
+    month_bounds(month) # Validate before issuing any queries
+    await outstanding_queue.barrier(user_id=user_id)
+
+    banks, cards, budget, recent_transactions, usage = await asyncio.gather(
+        bank_collection.find({"userId": user_id}, BANK_PROJECTION).to_list(100),
+        card_collection.find({"userId": user_id}, CARD_PROJECTION).to_list(100),
+        budget_collection.find_one({"userId": user_id, "monthYear": month}, BUDGET_PROJECTION),
+        transaction_collection.find(hot_only({"userId": user_id}), RECENT_PROJECTION)
+            .sort([("date", -1), ("_id", -1)]).limit(recent).to_list(recent),
+        budget_usage_collection.find_one({"userId": user_id, "monthYear": month}, {"_id": 0, "total": 1}),
+    )
+    spent = usage["total"] if usage else 0
+    if len(recent_transactions) < recent:
+        recent_transactions = await merge_cold(recent_transactions, {"userId": user_id}, recent, RECENT_PROJECTION)
+
+    total_limit = 0.0
+    total_outstanding = 0.0
+    for card in cards:
+        if card.get("cardType") in CREDIT_CARD_TYPES:
+            limit = card.get("creditLimit") or 0
+            outstanding = card.get("currentOutstanding") or 0
+            card["utilization"] = _percentage(outstanding, limit)
+            total_limit += limit
+            total_outstanding += outstanding
+
+    total_balance = sum(bank.get("balance") or 0 for bank in banks)
+
+    budget_progress = None
+    if budget:
+        total_budget = budget.get("totalBudget") or 0
+        budget_progress = BudgetProgress(
+            totalBudget=total_budget,
+            spent=round(spent, 2),
+            remaining=round(total_budget - spent, 2),
+            usedPercentage=_percentage(spent, total_budget),
+            savingsGoal=budget.get("savingsGoal"),
+        )
+
+    return DashboardSummary(
+        userId=user_id,
+        month=month,
+        totalBalance=round(total_balance, 2),
+        totalCreditLimit=round(total_limit, 2),
+        totalOutstanding=round(total_outstanding, 2),
+        netBalance=round(total_balance - total_outstanding, 2),
+        creditUtilization=_percentage(total_outstanding, total_limit),
+        budget=budget_progress,
+        bankAccounts=banks,
+        cards=cards,
+        recentTransactions=recent_transactions,
+    )
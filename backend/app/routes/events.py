@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from app.events import broker
+
+router = APIRouter()
+
+@router.get("/events/{user_id}", response_description="Server-sent stream of changes to the user's data")
+async def stream_events(user_id: str, request: Request):
+    return StreamingResponse(
+        broker.stream(user_id, request.is_disconnected),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they are written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
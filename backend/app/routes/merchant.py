@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Query, Request
+from pydantic import TypeAdapter
+from typing import List
+from app.models.merchant import MerchantSuggestion
+from app.merchants import SUGGEST_LIMIT, merchant_key, suggest_merchants
+from app.cache import cached_json
+
+router = APIRouter()
+
+_suggestions_adapter = TypeAdapter(List[MerchantSuggestion])
+
+@router.get("/merchants/suggest", response_description="Autocomplete a user's merchants by prefix", response_model=List[MerchantSuggestion])
+async def suggest(
+    request: Request,
+    user_id: str = Query(..., alias="userId"),
+    prefix: str = Query("", max_length=100),
+    limit: int = Query(SUGGEST_LIMIT, ge=1, le=50),
+):
+    # Keystrokes repeat the same prefixes; the cache is dropped whenever the user's merchants change
+    key = merchant_key(prefix)
+    async def load():
+        suggestions = await suggest_merchants(user_id, key, limit)
+        return _suggestions_adapter.dump_json(_suggestions_adapter.validate_python(suggestions))
+    return await cached_json(request, (user_id, "merchants", key, limit), load)
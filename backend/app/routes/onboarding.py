@@ -0,0 +1,116 @@
+from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
+from motor.motor_asyncio import AsyncIOMotorCollection
+from app.models.onboarding import OnboardingPayload, OnboardingResult
+from app.database import (
+    get_client,
+    supports_transactions,
+    get_user_collection,
+    get_bank_collection,
+    get_card_collection,
+    get_budget_collection,
+)
+from app.cache import response_cache
+from app.photos import decode_data_url, save_photo
+from app.repository import insert_documents, update_document, upsert_document
+from app.routes.user import USER_PROJECTION
+from app.security import create_access_token
+from app.events import publish
+from datetime import datetime
+from bson import ObjectId
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+@router.post("/onboarding/{user_id}", response_description="Save the whole onboarding wizard at once", response_model=OnboardingResult)
+async def complete_onboarding(
+    user_id: str,
+    payload: OnboardingPayload = Body(...),
+    user_collection: AsyncIOMotorCollection = Depends(get_user_collection),
+    bank_collection: AsyncIOMotorCollection = Depends(get_bank_collection),
+    card_collection: AsyncIOMotorCollection = Depends(get_card_collection),
+    budget_collection: AsyncIOMotorCollection = Depends(get_budget_collection),
+):
+    owners = [item.user_id for item in (*payload.bank_accounts, *payload.cards, *([payload.budget] if payload.budget else []))]
+    if any(owner != user_id for owner in owners):
+        raise HTTPException(status_code=400, detail="Every account, card and budget must belong to the user being onboarded")
+
+    # Checked before anything is stored, so a bad id doesn't leave a photo behind
+    if await user_collection.find_one({"_id": ObjectId(user_id)}, {"_id": 1}) is None:
+        raise HTTPException(status_code=404, detail=f"User {user_id} not found")
+
+    now = datetime.utcnow()
+    accounts = [{**jsonable_encoder(account), "created_at": now, "updated_at": now} for account in payload.bank_accounts]
+    cards = [{**jsonable_encoder(card), "created_at": now, "isActive": True} for card in payload.cards]
+    for card in cards:
+        card["openingOutstanding"] = card.get("currentOutstanding") or 0
+    budget = {**jsonable_encoder(payload.budget), "updated_at": now} if payload.budget else None
+    # Ids are known up front so a partly failed insert_many can be undone
+    for doc in (*accounts, *cards):
+        doc["_id"] = ObjectId()
+
+    user_fields = {"onboarding_completed": True, "updated_at": now}
+    if payload.employment_info is not None:
+        user_fields["employment_info"] = jsonable_encoder(payload.employment_info)
+    if payload.personal_info is not None:
+        personal_info = jsonable_encoder(payload.personal_info)
+        photo = personal_info.pop("profile_photo", None)
+        if photo:
+            # Stored before the writes below; if they fail, the user's next upload replaces it
+            try:
+                user_fields["profile_photo_url"] = await save_photo(user_id, decode_data_url(photo))
+            except ValueError as exc:
+                raise HTTPException(status_code=400, detail=str(exc))
+        user_fields["personal_info"] = personal_info
+
+    result = {"bankAccounts": accounts, "cards": cards, "budget": None}
+    undo = []
+
+    async def write(session=None):
+        # Each undo is registered before its write, which may fail after storing part of the batch
+        if accounts:
+            undo.append(lambda: bank_collection.delete_many({"_id": {"$in": [doc["_id"] for doc in accounts]}}))
+        await insert_documents(bank_collection, accounts, session=session)
+        if cards:
+            undo.append(lambda: card_collection.delete_many({"_id": {"$in": [doc["_id"] for doc in cards]}}))
+        await insert_documents(card_collection, cards, session=session)
+
+        if budget is not None:
+            query = {"userId": user_id, "monthYear": budget["monthYear"]}
+            if session is None:
+                # The upsert may overwrite this month's budget, so keep it to restore
+                previous = await budget_collection.find_one(query)
+                undo.append(
+                    (lambda: budget_collection.replace_one({"_id": previous["_id"]}, previous)) if previous
+                    else (lambda: budget_collection.delete_one(query))
+                )
+            result["budget"] = await upsert_document(budget_collection, query, budget, on_insert={"created_at": now}, session=session)
+
+        # Last, so nothing written after it can fail and leave the user marked as onboarded
+        result["user"] = await update_document(user_collection, {"_id": ObjectId(user_id)}, {"$set": user_fields}, USER_PROJECTION, session=session)
+        if result["user"] is None:
+            raise HTTPException(status_code=404, detail=f"User {user_id} not found")
+
+    if await supports_transactions():
+        async with await get_client().start_session() as session:
+            # Retries the whole write on TransientTransactionError and the commit on unknown results
+            await session.with_transaction(write)
+    else:
+        # Standalone servers have no transactions; undo whatever was written if a later step fails
+        try:
+            await write()
+        except Exception:
+            for step in reversed(undo):
+                try:
+                    await step()
+                except Exception:
+                    logger.exception("Could not roll back onboarding write for user %s", user_id)
+            raise
+
+    result["access_token"] = create_access_token(result["user"])
+    response_cache.invalidate(user_id)
+    # Everything changed at once; other open tabs simply reload
+    publish(user_id, "resync", {})
+    return result
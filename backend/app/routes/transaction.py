@@ -1,57 +1,325 @@
-from fastapi import APIRouter, Body, HTTPException, status
+from fastapi import APIRouter, Body, Depends, File, Header, HTTPException, Query, Response, UploadFile, status
 from fastapi.encoders import jsonable_encoder
-from typing import List
-from app.models.transaction import TransactionCreate, TransactionUpdate, TransactionInDB
-from app.database import transaction_collection, card_collection
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from typing import List, Optional
+from app.models.transaction import TransactionCreate, TransactionUpdate, TransactionInDB, ImportReport, ImportRowError
+from app.database import get_transaction_collection, get_reporting_transaction_collection, get_card_collection
+from app.queries import transaction_filters, encode_cursor, decode_cursor
+from app.importers import iter_csv_rows, iter_ofx_rows
+from app.budget_usage import apply_usage
+from app.merchants import apply_merchants
+from app.cold_storage import delete_cold, hot_only, iter_with_cold, merge_cold, search_cold
+from app.dedupe import (
+    DUPLICATE_KEY_ERROR,
+    FINGERPRINT_FIELD,
+    IDEMPOTENCY_FIELD,
+    MAX_OCCURRENCES,
+    assign_fingerprints,
+    cold_duplicates,
+    duplicate_field,
+    fingerprint,
+)
+from app.events import publish, transaction_event
+from app.billing import invalidate_statements
+from app.outstanding import PENDING_FIELD, outstanding_queue
+from app.repository import insert_document, delete_document
+from app.serialization import WireSchema
+from app.exporters import EXPORT_PROJECTION, stream_csv, stream_ndjson
+from collections import defaultdict
 from datetime import datetime
 from bson import ObjectId
+import io
+import itertools
 
 router = APIRouter()
 
+IMPORT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 200
+EXPORT_BATCH_SIZE = 1000
+
+# List routes serialize straight from the projected documents instead of re-validating them
+TRANSACTION_WIRE = WireSchema(TransactionInDB)
+
+async def _insert_unique(transaction_collection, transaction: dict, allow_duplicate: bool):
+    """Insert under the first free fingerprint; returns (document, replayed).
+
+    The unique indexes make a duplicate a single failed insert rather than a lookup first.
+    """
+    for occurrence in range(MAX_OCCURRENCES):
+        transaction[FINGERPRINT_FIELD] = fingerprint(transaction, occurrence)
+        transaction.pop("_id", None) # insert_one sets it even when the write fails
+        existing = None
+        try:
+            if transaction[FINGERPRINT_FIELD] not in await cold_duplicates([transaction]):
+                return await insert_document(transaction_collection, transaction), False
+        except DuplicateKeyError as e:
+            # A retry collides on both indexes and the server reports only one, so check the key either way
+            if IDEMPOTENCY_FIELD in transaction:
+                existing = await transaction_collection.find_one(
+                    {"userId": transaction["userId"], IDEMPOTENCY_FIELD: transaction[IDEMPOTENCY_FIELD]}
+                )
+                # A retried request gets the transaction it created; a reused key with another body is an error
+                if existing is not None:
+                    if fingerprint(existing) == fingerprint(transaction):
+                        return existing, True
+                    raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different transaction")
+            if duplicate_field(e.details) != FINGERPRINT_FIELD:
+                raise
+            existing = await transaction_collection.find_one({FINGERPRINT_FIELD: transaction[FINGERPRINT_FIELD]}, {"_id": 1})
+        if not allow_duplicate:
+            raise HTTPException(status_code=409, detail={
+                "message": "An identical transaction already exists; resend with allowDuplicate=true to record it again",
+                "transactionId": str(existing["_id"]) if existing else None,
+            })
+    raise HTTPException(status_code=409, detail=f"More than {MAX_OCCURRENCES} identical transactions on one day")
+
 @router.post("/transactions", response_description="Add new transaction", response_model=TransactionInDB)
-async def create_transaction(transaction: TransactionCreate = Body(...)):
+async def create_transaction(
+    response: Response,
+    transaction: TransactionCreate = Body(...),
+    allow_duplicate: bool = Query(False, alias="allowDuplicate", description="Record it even if an identical transaction exists"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=200),
+    transaction_collection: AsyncIOMotorCollection = Depends(get_transaction_collection),
+    card_collection: AsyncIOMotorCollection = Depends(get_card_collection),
+):
     transaction = jsonable_encoder(transaction)
     transaction["created_at"] = datetime.utcnow()
     transaction["updated_at"] = datetime.utcnow()
+    if idempotency_key:
+        transaction[IDEMPOTENCY_FIELD] = idempotency_key
+    # The card update is queued; the flag journals it in the same write as the transaction
+    on_card = bool(transaction.get("cardId")) and transaction.get("paymentMode") == "Credit Card"
+    if on_card:
+        transaction[PENDING_FIELD] = True
     
-    new_transaction = await transaction_collection.insert_one(transaction)
-    created_transaction = await transaction_collection.find_one({"_id": new_transaction.inserted_id})
+    created_transaction, replayed = await _insert_unique(transaction_collection, transaction, allow_duplicate)
+    if replayed:
+        # Its side effects were applied by the request that created it
+        response.headers["Idempotent-Replayed"] = "true"
+        return created_transaction
     
     # Update Card outstanding if linked to a card
-    if transaction.get("cardId") and transaction.get("paymentMode") == "Credit Card":
-        await card_collection.update_one(
-            {"_id": ObjectId(transaction["cardId"])},
-            {"$inc": {"currentOutstanding": transaction["amount"]}}
+    if on_card:
+        await outstanding_queue.add(
+            transaction["cardId"], transaction["userId"], transaction["amount"], transaction_id=created_transaction["_id"]
         )
+    await apply_usage(added=[transaction])
+    await apply_merchants(added=[transaction])
+    await invalidate_statements([transaction])
+    publish(transaction["userId"], "transaction.created", transaction_event(created_transaction))
 
     return created_transaction
 
+def _record_error(report: ImportReport, row: int, error: str):
+    report.failed += 1
+    if len(report.errors) < MAX_REPORTED_ERRORS:
+        report.errors.append(ImportRowError(row=row, error=error))
+    else:
+        report.errors_truncated = True
+
+async def _insert_batch(transaction_collection, batch: list, report: ImportReport, seen: dict):
+    """insert_many one batch of (row, doc) pairs and queue the inserted ones' card deltas.
+
+    Rows already stored (same fingerprint) are counted as duplicates and skipped, so
+    re-importing an overlapping statement only adds the new rows.
+    """
+    assign_fingerprints((doc for _, doc in batch), seen)
+    cold = await cold_duplicates(doc for _, doc in batch)
+    pending = [(row, doc) for row, doc in batch if doc[FINGERPRINT_FIELD] not in cold]
+    report.duplicates += len(batch) - len(pending)
+
+    failed_rows = set()
+    try:
+        if pending:
+            await transaction_collection.insert_many([doc for _, doc in pending], ordered=False)
+    except BulkWriteError as e:
+        for write_error in e.details.get("writeErrors", []):
+            row = pending[write_error["index"]][0]
+            failed_rows.add(row)
+            if write_error.get("code") == DUPLICATE_KEY_ERROR:
+                report.duplicates += 1
+            else:
+                _record_error(report, row, write_error.get("errmsg", "Write failed"))
+
+    inserted = [doc for row, doc in pending if row not in failed_rows]
+    # Journaled by PENDING_FIELD like a single create, so reconcile and replay see them
+    await outstanding_queue.add_transactions(inserted)
+    report.imported += len(inserted)
+    await apply_usage(added=inserted)
+    await apply_merchants(added=inserted)
+    await invalidate_statements(inserted)
+    batch.clear()
+
+@router.post("/transactions/import/{user_id}", response_description="Import a CSV or OFX statement", response_model=ImportReport)
+async def import_statement(
+    user_id: str,
+    file: UploadFile = File(...),
+    card_id: Optional[str] = Query(None, alias="cardId"),
+    payment_mode: Optional[str] = Query(None, alias="paymentMode", description="Defaults to Credit Card when cardId is given"),
+    category: str = Query("Others", description="Used for rows without a category"),
+    statement_format: Optional[str] = Query(None, alias="format", pattern="^(csv|ofx)$"),
+    transaction_collection: AsyncIOMotorCollection = Depends(get_transaction_collection),
+):
+    payment_mode = payment_mode or ("Credit Card" if card_id else None)
+    if not payment_mode:
+        raise HTTPException(status_code=400, detail="paymentMode is required when no cardId is given")
+
+    if statement_format is None:
+        filename = (file.filename or "").lower()
+        statement_format = "ofx" if filename.endswith((".ofx", ".qfx")) else "csv"
+    parse_rows = iter_ofx_rows if statement_format == "ofx" else iter_csv_rows
+
+    defaults = {"category": category, "paymentMode": payment_mode, "merchant": "Unknown"}
+    report = ImportReport()
+    seen = defaultdict(int)
+    batch = []
+    now = datetime.utcnow()
+
+    # Read the spooled upload line by line so memory stays flat regardless of file size; the
+    # reads are file I/O, so each batch of rows is parsed on a worker thread
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        rows = parse_rows(stream)
+        while chunk := await run_in_threadpool(list, itertools.islice(rows, IMPORT_BATCH_SIZE)):
+            for row, fields in chunk:
+                try:
+                    transaction = TransactionCreate(**{**defaults, **fields, "userId": user_id, "cardId": card_id})
+                except ValidationError as e:
+                    _record_error(report, row, "; ".join(
+                        f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+                    ))
+                    continue
+
+                doc = jsonable_encoder(transaction)
+                doc["created_at"] = now
+                doc["updated_at"] = now
+                if card_id and doc.get("paymentMode") == "Credit Card":
+                    doc[PENDING_FIELD] = True
+                batch.append((row, doc))
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    await _insert_batch(transaction_collection, batch, report, seen)
+        if batch:
+            await _insert_batch(transaction_collection, batch, report, seen)
+    finally:
+        stream.detach()
+
+    if report.imported:
+        # Too many rows to send one by one; listeners refetch
+        publish(user_id, "transactions.imported", {"imported": report.imported})
+
+    return report
+
+async def _list_page(transaction_collection, query: dict, limit: int, cursor: Optional[str]):
+    page_query = {"$and": [query, decode_cursor(cursor)]} if cursor else query
+
+    transactions = await (
+        transaction_collection.find(hot_only(page_query), TRANSACTION_WIRE.projection)
+        .sort([("date", -1), ("_id", -1)])
+        .limit(limit)
+        .to_list(limit)
+    )
+    # Older months may have been compacted into buckets; those that sort into this page are merged in
+    transactions = await merge_cold(transactions, query, limit, TRANSACTION_WIRE.projection, cursor)
+    headers = {}
+    if len(transactions) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(transactions[-1])
+    return TRANSACTION_WIRE.response(transactions, headers=headers)
+
 @router.get("/transactions/card/{card_id}", response_description="Get transactions for a card", response_model=List[TransactionInDB])
-async def list_transactions_by_card(card_id: str):
-    transactions = await transaction_collection.find({"cardId": card_id}).sort("date", -1).to_list(100)
-    return transactions
+async def list_transactions_by_card(
+    card_id: str,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    filters: dict = Depends(transaction_filters),
+    transaction_collection: AsyncIOMotorCollection = Depends(get_transaction_collection),
+):
+    query = {**filters, "cardId": card_id}
+    return await _list_page(transaction_collection, query, limit, cursor)
 
 @router.get("/transactions/user/{user_id}", response_description="Get all user transactions", response_model=List[TransactionInDB])
-async def list_transactions_by_user(user_id: str):
-    transactions = await transaction_collection.find({"userId": user_id}).sort("date", -1).to_list(100)
-    return transactions
+async def list_transactions_by_user(
+    user_id: str,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    filters: dict = Depends(transaction_filters),
+    transaction_collection: AsyncIOMotorCollection = Depends(get_transaction_collection),
+):
+    query = {**filters, "userId": user_id}
+    return await _list_page(transaction_collection, query, limit, cursor)
 
-@router.delete("/transactions/{id}", response_description="Delete a transaction")
-async def delete_transaction(id: str):
-    # Fetch transaction first to reverse card balance impact if needed
-    transaction = await transaction_collection.find_one({"_id": ObjectId(id)})
-    if not transaction:
-        raise HTTPException(status_code=404, detail="Transaction not found")
+@router.get("/transactions/search", response_description="Full-text search of a user's transactions", response_model=List[TransactionInDB])
+async def search_transactions(
+    user_id: str = Query(..., alias="userId"),
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find in merchant, description or notes"),
+    limit: int = Query(50, ge=1, le=200),
+    filters: dict = Depends(transaction_filters),
+    transaction_collection: AsyncIOMotorCollection = Depends(get_transaction_collection),
+):
+    # Served by the userId_text index, best matches first and newest first among equals
+    transactions = await (
+        transaction_collection.find(hot_only({**filters, "userId": user_id, "$text": {"$search": q}}), TRANSACTION_WIRE.projection)
+        .sort([("score", {"$meta": "textScore"}), ("date", -1)])
+        .limit(limit)
+        .to_list(limit)
+    )
+    if len(transactions) < limit:
+        transactions += await search_cold(user_id, q, filters, limit - len(transactions), TRANSACTION_WIRE.projection)
+    return TRANSACTION_WIRE.response(transactions)
+
+@router.get("/transactions/user/{user_id}/export", response_description="Stream a user's full transaction history")
+async def export_transactions(
+    user_id: str,
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    filters: dict = Depends(transaction_filters),
+    transaction_collection: AsyncIOMotorCollection = Depends(get_reporting_transaction_collection),
+):
+    query = {**filters, "userId": user_id}
+    hot = (
+        transaction_collection.find(hot_only(query), EXPORT_PROJECTION)
+        .sort([("date", -1), ("_id", -1)])
+        .batch_size(EXPORT_BATCH_SIZE)
+    )
+    cursor = iter_with_cold(hot, query, EXPORT_PROJECTION, reporting=True)
+    if export_format == "csv":
+        body, media_type = stream_csv(cursor), "text/csv"
+    else:
+        body, media_type = stream_ndjson(cursor), "application/x-ndjson"
 
-    delete_result = await transaction_collection.delete_one({"_id": ObjectId(id)})
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="transactions-{user_id}.{export_format}"'},
+    )
+
+@router.delete("/transactions/{id}", response_description="Delete a transaction")
+async def delete_transaction(
+    id: str,
+    transaction_collection: AsyncIOMotorCollection = Depends(get_transaction_collection),
+    card_collection: AsyncIOMotorCollection = Depends(get_card_collection),
+):
+    # The deleted document is returned so the card balance impact can be reversed
+    transaction = await delete_document(transaction_collection, {"_id": ObjectId(id)})
+    if transaction is None:
+        # Compacted transactions live in their month's bucket
+        transaction = await delete_cold(ObjectId(id))
     
-    if delete_result.deleted_count == 1:
+    if transaction is not None:
         # Reverse balance update if it was a credit card expense
         if transaction.get("cardId") and transaction.get("paymentMode") == "Credit Card":
-             await card_collection.update_one(
-                {"_id": ObjectId(transaction["cardId"])},
-                {"$inc": {"currentOutstanding": -transaction["amount"]}}
+            # If this process holds its own increment the two cancel out in memory. Otherwise journal
+            # the reversal: the increment was applied, or another worker holds it and will apply it
+            await outstanding_queue.add(
+                transaction["cardId"], transaction["userId"], -transaction["amount"],
+                journal=not outstanding_queue.holds(transaction["_id"]),
             )
+        await apply_usage(removed=[transaction])
+        await apply_merchants(removed=[transaction])
+        await invalidate_statements([transaction])
+        publish(transaction["userId"], "transaction.deleted", transaction_event(transaction))
         return {"message": "Transaction deleted"}
     
     raise HTTPException(status_code=404, detail="Transaction not found")
@@ -1,71 +1,127 @@
-from fastapi import APIRouter, Body, HTTPException, status
+from fastapi import APIRouter, Body, Depends, File, HTTPException, Request, Response, UploadFile, status
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
-from app.models.user import UserCreate, UserLogin, UserUpdate, UserInDB
-from app.database import user_collection
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pydantic import TypeAdapter
+from app.models.user import UserCreate, UserLogin, UserUpdate, UserInDB, UserUpdated, LoginResponse, TokenClaims
+from app.database import get_user_collection
+from app.cache import cached_json, response_cache
+from app.repository import insert_document, update_document
+from app.photos import MAX_UPLOAD_BYTES, decode_data_url, load_photo, save_photo
+from app.security import hash_password, verify_password, create_access_token, current_claims
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
 from bson import ObjectId
-import hashlib
 
 router = APIRouter()
 
-def hash_password(password: str) -> str:
-    """Hash password using SHA256"""
-    return hashlib.sha256(password.encode()).hexdigest()
+_user_adapter = TypeAdapter(UserInDB)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify password against hash"""
-    return hash_password(plain_password) == hashed_password
+# Legacy inline base64 photos never leave the database; clients load profile_photo_url instead
+USER_PROJECTION = {"personal_info.profile_photo": 0}
 
 @router.post("/auth/register", response_description="Register new user", response_model=UserInDB)
-async def register_user(user: UserCreate = Body(...)):
-    # Check if email already exists
-    if await user_collection.find_one({"email": user.email}):
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
+async def register_user(user: UserCreate = Body(...), user_collection: AsyncIOMotorCollection = Depends(get_user_collection)):
     user_dict = jsonable_encoder(user)
-    user_dict["password"] = hash_password(user.password)
+    user_dict["password"] = await hash_password(user.password)
     user_dict["created_at"] = datetime.utcnow()
     user_dict["updated_at"] = datetime.utcnow()
     user_dict["onboarding_completed"] = False
     
-    new_user = await user_collection.insert_one(user_dict)
-    created_user = await user_collection.find_one({"_id": new_user.inserted_id})
-    return created_user
+    # The unique email index rejects duplicates, so no lookup is needed first
+    try:
+        return await insert_document(user_collection, user_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
 
-@router.post("/auth/login", response_description="Login user", response_model=UserInDB)
-async def login_user(credentials: UserLogin = Body(...)):
-    user = await user_collection.find_one({"email": credentials.email})
+@router.post("/auth/login", response_description="Login user", response_model=LoginResponse)
+async def login_user(credentials: UserLogin = Body(...), user_collection: AsyncIOMotorCollection = Depends(get_user_collection)):
+    user = await user_collection.find_one({"email": credentials.email}, USER_PROJECTION)
     
     if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    if not verify_password(credentials.password, user["password"]):
+    valid, needs_rehash = await verify_password(credentials.password, user["password"])
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid email or password")
-    
+
+    # Upgrade legacy SHA-256 (or weaker bcrypt) hashes now that we have the plain password
+    if needs_rehash:
+        new_hash = await hash_password(credentials.password)
+        await user_collection.update_one({"_id": user["_id"], "password": user["password"]}, {"$set": {"password": new_hash}})
+        user["password"] = new_hash
+        response_cache.invalidate(str(user["_id"]), "user")
+
+    user["access_token"] = create_access_token(user)
     return user
 
+@router.get("/auth/me", response_description="Identity from the access token", response_model=TokenClaims)
+async def read_current_user(claims: dict = Depends(current_claims)):
+    return claims
+
 @router.get("/user/{id}", response_description="Get a single user", response_model=UserInDB)
-async def get_user(id: str):
-    if (user := await user_collection.find_one({"_id": ObjectId(id)})) is not None:
-        return user
-    raise HTTPException(status_code=404, detail=f"User {id} not found")
+async def get_user(id: str, request: Request, user_collection: AsyncIOMotorCollection = Depends(get_user_collection)):
+    async def load():
+        if (user := await user_collection.find_one({"_id": ObjectId(id)}, USER_PROJECTION)) is not None:
+            return _user_adapter.dump_json(_user_adapter.validate_python(user), by_alias=True)
+        raise HTTPException(status_code=404, detail=f"User {id} not found")
+    return await cached_json(request, (id, "user"), load)
 
-@router.put("/user/{id}", response_description="Update user profile", response_model=UserInDB)
-async def update_user(id: str, user: UserUpdate = Body(...)):
+@router.put("/user/{id}", response_description="Update user profile", response_model=UserUpdated)
+async def update_user(id: str, user: UserUpdate = Body(...), user_collection: AsyncIOMotorCollection = Depends(get_user_collection)):
     # Filter out None values
     user_data = {k: v for k, v in user.dict(exclude_unset=True).items() if v is not None}
+
+    # Onboarding still sends the photo inline; store it in GridFS and keep only its URL
+    photo = (user_data.get("personal_info") or {}).pop("profile_photo", None)
+    if photo:
+        if await user_collection.find_one({"_id": ObjectId(id)}, {"_id": 1}) is None:
+            raise HTTPException(status_code=404, detail=f"User {id} not found")
+        try:
+            user_data["profile_photo_url"] = await save_photo(id, decode_data_url(photo))
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
     
     if len(user_data) >= 1:
         user_data["updated_at"] = datetime.utcnow()
-        update_result = await user_collection.update_one(
-            {"_id": ObjectId(id)}, {"$set": user_data}
-        )
-        if update_result.modified_count == 1:
-            if (updated_user := await user_collection.find_one({"_id": ObjectId(id)})) is not None:
-                return updated_user
-                
-    if (existing_user := await user_collection.find_one({"_id": ObjectId(id)})) is not None:
-        return existing_user
-        
+        updated_user = await update_document(user_collection, {"_id": ObjectId(id)}, {"$set": user_data}, USER_PROJECTION)
+        response_cache.invalidate(id, "user")
+    else:
+        updated_user = await user_collection.find_one({"_id": ObjectId(id)}, USER_PROJECTION)
+
+    if updated_user is not None:
+        if "onboarding_completed" in user_data:
+            updated_user["access_token"] = create_access_token(updated_user)
+        return updated_user
     raise HTTPException(status_code=404, detail=f"User {id} not found")
+
+@router.put("/user/{id}/photo", response_description="Upload a profile photo", response_model=UserInDB)
+async def upload_photo(id: str, file: UploadFile = File(...), user_collection: AsyncIOMotorCollection = Depends(get_user_collection)):
+    if await user_collection.find_one({"_id": ObjectId(id)}, {"_id": 1}) is None:
+        raise HTTPException(status_code=404, detail=f"User {id} not found")
+    data = await file.read(MAX_UPLOAD_BYTES + 1)
+    try:
+        url = await save_photo(id, data)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    updated_user = await update_document(
+        user_collection,
+        {"_id": ObjectId(id)},
+        {"$set": {"profile_photo_url": url, "updated_at": datetime.utcnow()}, "$unset": {"personal_info.profile_photo": ""}},
+        USER_PROJECTION,
+    )
+    response_cache.invalidate(id, "user")
+    return updated_user
+
+@router.get("/user/{id}/photo/{photo_id}", response_description="Get a profile photo")
+async def get_photo(id: str, photo_id: str, request: Request):
+    # A new upload gets a new id (and URL), so a stored photo never changes and can be cached for good
+    headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{photo_id}"'}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    photo = await load_photo(id, photo_id)
+    if photo is None:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    content, media_type = photo
+    return Response(content=content, media_type=media_type, headers=headers)
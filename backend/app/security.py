@@ -0,0 +1,97 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import re
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+import bcrypt
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
+
+logger = logging.getLogger(__name__)
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt releases the GIL, so a few threads hash in parallel without touching the event loop
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+JWT_ALGORITHM = "HS256"
+ACCESS_TOKEN_TTL_MINUTES = int(os.getenv("ACCESS_TOKEN_TTL_MINUTES", "60"))
+JWT_SECRET = os.getenv("JWT_SECRET")
+if not JWT_SECRET:
+    JWT_SECRET = secrets.token_urlsafe(32)
+    logger.warning("JWT_SECRET is not set; tokens will not survive a restart or work across workers")
+
+# Hex SHA-256 digests written before passwords were hashed with bcrypt
+_LEGACY_HASH = re.compile(r"^[0-9a-f]{64}$")
+
+_hash_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+def _secret(password: str) -> bytes:
+    # bcrypt only looks at 72 bytes; longer passwords are pre-hashed so every byte counts
+    encoded = password.encode("utf-8")
+    if len(encoded) > 72:
+        encoded = base64.b64encode(hashlib.sha256(encoded).digest())
+    return encoded
+
+def _hash(password: str) -> str:
+    return bcrypt.hashpw(_secret(password), bcrypt.gensalt(BCRYPT_ROUNDS)).decode("ascii")
+
+def _verify(password: str, hashed: str) -> Tuple[bool, bool]:
+    if _LEGACY_HASH.match(hashed):
+        legacy = hashlib.sha256(password.encode("utf-8")).hexdigest()
+        return hmac.compare_digest(legacy, hashed), True
+    try:
+        valid = bcrypt.checkpw(_secret(password), hashed.encode("ascii"))
+    except ValueError:
+        return False, False
+    # Rounds are stored as "$2b$12$..."; rehash hashes made with a lower cost than configured
+    return valid, valid and int(hashed.split("$")[2]) < BCRYPT_ROUNDS
+
+async def hash_password(password: str) -> str:
+    """bcrypt hash of the password, computed on the hashing pool"""
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, _hash, password)
+
+async def verify_password(password: str, hashed: str) -> Tuple[bool, bool]:
+    """(matches, needs_rehash) for a stored bcrypt or legacy SHA-256 hash, checked on the hashing pool"""
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, _verify, password, hashed)
+
+def create_access_token(user: dict) -> str:
+    """Signed token carrying the identity claims the UI needs"""
+    now = datetime.now(timezone.utc)
+    claims = {
+        "sub": str(user["_id"]),
+        "email": user["email"],
+        "name": user["name"],
+        "onboarding_completed": user.get("onboarding_completed", False),
+        "iat": now,
+        "exp": now + timedelta(minutes=ACCESS_TOKEN_TTL_MINUTES),
+    }
+    return jwt.encode(claims, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+def decode_access_token(token: str) -> dict:
+    try:
+        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except JWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+_bearer = HTTPBearer(auto_error=False)
+
+def current_claims(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)) -> dict:
+    """Claims of the request's bearer token; identifies the caller without a database lookup"""
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return decode_access_token(credentials.credentials)
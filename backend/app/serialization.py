@@ -0,0 +1,58 @@
+import json
+from datetime import datetime
+from typing import Iterable, Optional, Type
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError: # Optional speedup; the stdlib encoder produces the same JSON
+    orjson = None
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse that encodes ObjectId and datetime directly, via orjson when installed"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+class WireSchema:
+    """Projection and defaults that make raw Mongo documents match a response model's JSON.
+
+    Routes that opt in query with `projection` and return `response(docs)`, which skips
+    FastAPI's per-row Pydantic validation and re-serialization of the response_model.
+    The documents must already be in wire form, i.e. written through jsonable_encoder.
+    """
+
+    def __init__(self, model: Type[BaseModel]):
+        self.projection = {}
+        self._defaults = {}
+        self._factories = {}
+        for name, field in model.model_fields.items():
+            key = field.alias or name
+            self.projection[key] = 1
+            if field.is_required():
+                continue
+            if field.default_factory is not None:
+                self._factories[key] = field.default_factory
+            else:
+                self._defaults[key] = field.default
+
+    def rows(self, docs: Iterable[dict]) -> list:
+        defaults = {**self._defaults, **{key: factory() for key, factory in self._factories.items()}}
+        return [{**defaults, **doc} for doc in docs]
+
+    def response(self, docs: Iterable[dict], headers: Optional[dict] = None) -> FastJSONResponse:
+        return FastJSONResponse(self.rows(docs), headers=headers)
@@ -0,0 +1,354 @@
+"""Seed a benchmark database and replay a realistic request mix against the app in-process.
+
+    cd backend
+    python -m benchmarks.loadtest --users 200 --transactions 500 --requests 5000 --concurrency 32
+    python -m benchmarks.loadtest --in-memory --users 20 --transactions 100   # no mongod needed
+
+Runs against MONGO_DETAILS (a local mongod by default) in its own database, or against
+mongomock-motor with --in-memory. Prints p50/p95/p99 latency, throughput and Mongo
+commands per endpoint as JSON; --output also writes it to a file for comparing runs.
+Mongo command counts come from the command listener and are only available against a
+real server.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+CATEGORIES = ["Groceries", "Fuel/Transport", "Bills & Utilities", "Food & Dining", "Shopping", "Entertainment"]
+MERCHANTS = ["Amazon", "Swiggy", "Zomato", "Uber", "BigBasket", "Flipkart", "Netflix", "Shell", "DMart", "Myntra"]
+PASSWORD = "benchmark-password"
+SEED_BATCH_SIZE = 5000
+DEFAULT_MIX = "dashboard=35,list=30,create_delete=20,login=15"
+
+# Endpoint name -> (method, route template) as labelled by app.metrics
+ENDPOINTS = {
+    "dashboard": ("GET", "/api/dashboard/{user_id}"),
+    "list": ("GET", "/api/transactions/user/{user_id}"),
+    "create_transaction": ("POST", "/api/transactions"),
+    "delete_transaction": ("DELETE", "/api/transactions/{id}"),
+    "login": ("POST", "/api/auth/login"),
+}
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("dashboard", "list", "create_delete", "login"):
+            raise SystemExit(f"Unknown scenario in --mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+def _patch_mongomock():
+    """Fill the gaps in mongomock that the app runs into.
+
+    Its bulk builder predates the `sort` argument newer pymongo passes to UpdateOne, and it
+    drops partialFilterExpression, so the unique fingerprint and idempotency key indexes would
+    treat every transaction without those fields as a duplicate.
+    """
+    import mongomock.collection
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+
+    def _add_update(self, *args, sort=None, **kwargs):
+        return add_update(self, *args, **kwargs)
+    mongomock.collection.BulkOperationBuilder.add_update = _add_update
+
+    create_indexes = mongomock.collection.Collection.create_indexes
+
+    def _create_indexes(self, indexes, session=None):
+        plain = [index for index in indexes if "partialFilterExpression" not in index.document]
+        names = create_indexes(self, plain, session=session) if plain else []
+        for index in indexes:
+            partial = index.document.get("partialFilterExpression")
+            if partial is not None:
+                # Our partial indexes all filter on {field: {"$exists": True}}; a sparse index on
+                # just those fields behaves the same
+                keys = [(key, direction) for key, direction in index.document["key"].items() if key in partial]
+                names.append(self.create_index(
+                    keys, unique=index.document.get("unique", False), sparse=True, name=index.document["name"],
+                ))
+        return names
+    mongomock.collection.Collection.create_indexes = _create_indexes
+
+async def seed(args, rng: random.Random) -> dict:
+    """Insert users, accounts, cards, budgets and transactions straight into the collections"""
+    from app.database import USERS, BANK_ACCOUNTS, CARDS, TRANSACTIONS, BUDGETS, BUDGET_USAGE, get_database, get_collection
+    from app.budget_usage import apply_usage
+    from app.dedupe import assign_fingerprints
+    from app.indexes import ensure_indexes
+    from app.queries import month_key
+    from app.security import hash_password
+
+    database = get_database()
+    for name in (USERS, BANK_ACCOUNTS, CARDS, TRANSACTIONS, BUDGETS, BUDGET_USAGE):
+        await database.drop_collection(name)
+    await ensure_indexes()
+
+    started = time.perf_counter()
+    # Every user shares the password, so hash it once
+    password_hash = await hash_password(PASSWORD)
+    now = datetime.utcnow()
+    this_month = month_key(now)
+    users = []
+    pending = []
+    seen = defaultdict(int)
+    total_transactions = 0
+
+    async def flush():
+        if pending:
+            # Written like imported rows, so the duplicate-detection index holds real entries
+            assign_fingerprints(pending, seen)
+            await get_collection(TRANSACTIONS).insert_many(pending, ordered=False)
+            await apply_usage(added=pending)
+            pending.clear()
+
+    for index in range(args.users):
+        user_id = ObjectId()
+        card_id = ObjectId()
+        email = f"bench{index}@example.com"
+        outstanding = 0.0
+        for _ in range(args.transactions):
+            amount = round(rng.uniform(50, 5000), 2)
+            on_card = rng.random() < 0.6
+            if on_card:
+                outstanding += amount
+            pending.append({
+                "userId": str(user_id),
+                "cardId": str(card_id) if on_card else None,
+                "date": (now - timedelta(minutes=rng.randrange(365 * 24 * 60))).isoformat(),
+                "merchant": rng.choice(MERCHANTS),
+                "description": None,
+                "amount": amount,
+                "category": rng.choice(CATEGORIES),
+                "paymentMode": "Credit Card" if on_card else "UPI",
+                "isEMI": False,
+                "emiDetails": None,
+                "tags": [],
+                "notes": None,
+                "created_at": now,
+                "updated_at": now,
+            })
+            if len(pending) >= SEED_BATCH_SIZE:
+                await flush()
+        total_transactions += args.transactions
+
+        await get_collection(USERS).insert_one({
+            "_id": user_id, "name": f"Bench User {index}", "email": email, "password": password_hash,
+            "personal_info": None, "employment_info": None, "onboarding_completed": True,
+            "created_at": now, "updated_at": now,
+        })
+        await get_collection(BANK_ACCOUNTS).insert_one({
+            "userId": str(user_id), "bankName": "HDFC", "accountNumber": "0000", "ifscCode": "HDFC0000001",
+            "accountType": "Savings", "isPrimary": True,
+            "balance": round(rng.uniform(1000, 500000), 2), "created_at": now, "updated_at": now,
+        })
+        await get_collection(CARDS).insert_one({
+            "_id": card_id, "userId": str(user_id), "cardType": "Credit Card", "cardNumber": "4242",
+            "cardHolderName": f"Bench User {index}", "bankName": "HDFC", "expiryDate": "12/30",
+            "cardProvider": "Visa", "creditLimit": 500000.0, "currentOutstanding": round(outstanding, 2),
+            "cardStatus": "Active", "created_at": now, "updated_at": now,
+        })
+        await get_collection(BUDGETS).insert_one({
+            "userId": str(user_id), "monthYear": this_month, "totalBudget": 50000.0,
+            "categories": {category: 8000.0 for category in CATEGORIES}, "savingsGoal": 10000.0,
+            "created_at": now, "updated_at": now,
+        })
+        users.append({"id": str(user_id), "cardId": str(card_id), "email": email})
+    await flush()
+
+    return {
+        "users": users,
+        "stats": {
+            "users": args.users,
+            "transactions": total_transactions,
+            "seconds": round(time.perf_counter() - started, 3),
+        },
+    }
+
+async def load_users(limit: int) -> list:
+    """Reuse an already seeded database (--no-seed)"""
+    from app.database import USERS, CARDS, get_collection
+    users = []
+    async for user in get_collection(USERS).find({}, {"email": 1}).limit(limit):
+        card = await get_collection(CARDS).find_one({"userId": str(user["_id"])}, {"_id": 1})
+        users.append({"id": str(user["_id"]), "cardId": str(card["_id"]) if card else None, "email": user["email"]})
+    if not users:
+        raise SystemExit("No users in the benchmark database; run without --no-seed first")
+    return users
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, client, endpoint: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies[endpoint].append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            self.errors[endpoint] += 1
+        return response
+
+async def run_scenario(client, recorder: Recorder, scenario: str, user: dict, rng: random.Random):
+    if scenario == "dashboard":
+        await recorder.call(client, "dashboard", "GET", f"/api/dashboard/{user['id']}")
+    elif scenario == "list":
+        await recorder.call(client, "list", "GET", f"/api/transactions/user/{user['id']}", params={"limit": 50})
+    elif scenario == "login":
+        await recorder.call(client, "login", "POST", "/api/auth/login", json={"email": user["email"], "password": PASSWORD})
+    elif scenario == "create_delete":
+        response = await recorder.call(client, "create_transaction", "POST", "/api/transactions", json={
+            "userId": user["id"],
+            "cardId": user["cardId"],
+            "date": datetime.utcnow().isoformat(),
+            "merchant": rng.choice(MERCHANTS),
+            "amount": round(rng.uniform(50, 5000), 2),
+            "category": rng.choice(CATEGORIES),
+            "paymentMode": "Credit Card",
+        })
+        if response.status_code == 200:
+            await recorder.call(client, "delete_transaction", "DELETE", f"/api/transactions/{response.json()['_id']}")
+
+async def replay(client, users: list, mix: dict, requests: int, concurrency: int, seed: int) -> Recorder:
+    recorder = Recorder()
+    scenarios = list(mix)
+    weights = [mix[name] for name in scenarios]
+    remaining = requests
+
+    async def worker(worker_id: int):
+        nonlocal remaining
+        rng = random.Random(seed + worker_id)
+        while remaining > 0:
+            remaining -= 1
+            scenario = rng.choices(scenarios, weights)[0]
+            await run_scenario(client, recorder, scenario, rng.choice(users), rng)
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return recorder
+
+def mongo_snapshot() -> dict:
+    from app.metrics import MONGO_COMMANDS_PER_REQUEST, MONGO_SECONDS_PER_REQUEST
+    return {
+        name: (MONGO_COMMANDS_PER_REQUEST.summary(*labels), MONGO_SECONDS_PER_REQUEST.summary(*labels))
+        for name, labels in ENDPOINTS.items()
+    }
+
+def report(recorder: Recorder, elapsed: float, before: dict, after: dict, mongo_measured: bool) -> dict:
+    endpoints = {}
+    for name, samples in sorted(recorder.latencies.items()):
+        ordered = sorted(samples)
+        (count_before, ops_before), (_, seconds_before) = before[name]
+        (count_after, ops_after), (_, seconds_after) = after[name]
+        handled = count_after - count_before
+        endpoints[name] = {
+            "requests": len(samples),
+            "errors": recorder.errors[name],
+            "p50Ms": round(percentile(ordered, 50), 3),
+            "p95Ms": round(percentile(ordered, 95), 3),
+            "p99Ms": round(percentile(ordered, 99), 3),
+            "meanMs": round(sum(ordered) / len(ordered), 3),
+            "maxMs": round(ordered[-1], 3),
+            "throughputRps": round(len(samples) / elapsed, 1),
+            "mongoOpsPerRequest": round((ops_after - ops_before) / handled, 2) if mongo_measured and handled else None,
+            "mongoMsPerRequest": round((seconds_after - seconds_before) * 1000 / handled, 3) if mongo_measured and handled else None,
+        }
+    total = sum(len(samples) for samples in recorder.latencies.values())
+    return {
+        "endpoints": endpoints,
+        "total": {
+            "requests": total,
+            "errors": sum(recorder.errors.values()),
+            "seconds": round(elapsed, 3),
+            "throughputRps": round(total / elapsed, 1) if elapsed else None,
+        },
+    }
+
+async def benchmark(args) -> dict:
+    import httpx
+    from app import database
+    import main
+
+    if args.in_memory:
+        try:
+            import mongomock_motor
+        except ImportError:
+            raise SystemExit("--in-memory needs mongomock-motor (pip install mongomock-motor)")
+        _patch_mongomock()
+        database.connect(client=mongomock_motor.AsyncMongoMockClient())
+
+    rng = random.Random(args.seed)
+    async with main.app.router.lifespan_context(main.app):
+        if args.no_seed:
+            seeded = {"users": await load_users(args.users), "stats": None}
+        else:
+            seeded = await seed(args, rng)
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            mix = parse_mix(args.mix)
+            if args.warmup:
+                await replay(client, seeded["users"], mix, args.warmup, args.concurrency, args.seed + 1)
+            before = mongo_snapshot()
+            started = time.perf_counter()
+            recorder = await replay(client, seeded["users"], mix, args.requests, args.concurrency, args.seed)
+            elapsed = time.perf_counter() - started
+            after = mongo_snapshot()
+
+    result = report(recorder, elapsed, before, after, mongo_measured=not args.in_memory)
+    result["config"] = {
+        "backend": "mongomock" if args.in_memory else database.MONGO_DETAILS,
+        "database": database.DATABASE_NAME,
+        "users": args.users,
+        "transactionsPerUser": args.transactions,
+        "requests": args.requests,
+        "warmup": args.warmup,
+        "concurrency": args.concurrency,
+        "mix": mix,
+        "seed": args.seed,
+        "startedAt": datetime.utcnow().isoformat(),
+    }
+    result["seed"] = seeded["stats"]
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200, help="users to seed")
+    parser.add_argument("--transactions", type=int, default=500, help="transactions seeded per user")
+    parser.add_argument("--requests", type=int, default=5000, help="scenarios to replay in the measured run")
+    parser.add_argument("--warmup", type=int, default=200, help="scenarios replayed before measuring")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent simulated clients")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"scenario weights (default {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for data and request order")
+    parser.add_argument("--database", default="semippu_benchmark", help="database to seed (dropped first!)")
+    parser.add_argument("--in-memory", action="store_true", help="use mongomock-motor instead of a mongod")
+    parser.add_argument("--no-seed", action="store_true", help="reuse the data from a previous run")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    # Must be set before app.database is imported; never point the benchmark at real data
+    os.environ["MONGO_DATABASE"] = args.database
+    os.environ.setdefault("RESPONSE_CACHE_TTL", "60")
+    logging.basicConfig(level=logging.ERROR, stream=sys.stderr)
+
+    result = asyncio.run(benchmark(args))
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+
+if __name__ == "__main__":
+    main()
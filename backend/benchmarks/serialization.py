@@ -0,0 +1,85 @@
+"""Compare per-request CPU of the response_model path with the WireSchema fast path.
+
+    cd backend
+    python -m benchmarks.serialization --rows 100 --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from app.models.transaction import TransactionCreate, TransactionInDB
+from app.serialization import WireSchema, orjson
+
+CATEGORIES = ["Groceries", "Fuel/Transport", "Bills & Utilities", "Food & Dining", "Shopping"]
+
+def make_documents(rows: int) -> list:
+    """Documents shaped like what create_transaction stores"""
+    start = datetime(2024, 1, 1)
+    docs = []
+    for i in range(rows):
+        doc = jsonable_encoder(TransactionCreate(
+            userId=str(ObjectId()),
+            cardId=str(ObjectId()),
+            date=start + timedelta(hours=i),
+            merchant=f"Merchant {i}",
+            description="Card purchase",
+            amount=round(random.uniform(10, 5000), 2),
+            category=random.choice(CATEGORIES),
+            paymentMode="Credit Card",
+            tags=["online"],
+        ))
+        doc["_id"] = ObjectId()
+        doc["created_at"] = doc["updated_at"] = datetime.utcnow()
+        docs.append(doc)
+    return docs
+
+async def response_model_path(field, docs) -> bytes:
+    content = await serialize_response(field=field, response_content=docs)
+    return JSONResponse(content).body
+
+def fast_path(wire: WireSchema, docs) -> bytes:
+    return wire.response(docs).body
+
+def cpu_per_request(fn, requests: int) -> float:
+    started = time.process_time()
+    for _ in range(requests):
+        fn()
+    return (time.process_time() - started) / requests * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100, help="documents per response")
+    parser.add_argument("--requests", type=int, default=2000, help="responses to serialize per path")
+    args = parser.parse_args()
+
+    docs = make_documents(args.rows)
+    field = create_model_field("Response", List[TransactionInDB], mode="serialization")
+    wire = WireSchema(TransactionInDB)
+    loop = asyncio.new_event_loop()
+
+    baseline_body = loop.run_until_complete(response_model_path(field, docs))
+    if json.loads(fast_path(wire, docs)) != json.loads(baseline_body):
+        raise SystemExit("Fast path output differs from the response_model output")
+
+    baseline = cpu_per_request(lambda: loop.run_until_complete(response_model_path(field, docs)), args.requests)
+    fast = cpu_per_request(lambda: fast_path(wire, docs), args.requests)
+    print(json.dumps({
+        "rows": args.rows,
+        "requests": args.requests,
+        "encoder": "orjson" if orjson else "json",
+        "responseModelCpuMs": round(baseline, 4),
+        "fastPathCpuMs": round(fast, 4),
+        "savedCpuMs": round(baseline - fast, 4),
+        "speedup": round(baseline / fast, 2) if fast else None,
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
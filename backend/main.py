@@ -1,10 +1,46 @@
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from app import database
+from app.indexes import ensure_indexes, verify_query_plans
+from app.cache import response_cache
+from app.metrics import TimingMiddleware, render_metrics
+from app.outstanding import outstanding_queue
+from app.cold_storage import compaction_worker
+from app.events import broker
+from app.change_feed import change_feed
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client for the whole process, opened before the first request
+    database.connect()
+    try:
+        await database.warm_up()
+        await ensure_indexes()
+        # Refuse to start if a route query would fall back to a collection scan
+        if os.getenv("VERIFY_QUERY_PLANS", "").lower() in ("1", "true", "yes"):
+            await verify_query_plans()
+        await outstanding_queue.replay()
+        outstanding_queue.start()
+        compaction_worker.start()
+        await change_feed.start()
+        try:
+            yield
+        finally:
+            broker.close()
+            await change_feed.stop()
+            await compaction_worker.stop()
+            await outstanding_queue.stop()
+    finally:
+        database.close()
 
 app = FastAPI(
     title="Personal Finance Tracker API",
     description="Backend for the Personal Finance & Credit Card Tracker",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS Middleware
@@ -14,20 +50,40 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Idempotent-Replayed"],
 )
+app.add_middleware(TimingMiddleware)
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Personal Finance Tracker API"}
 
+@app.get("/api/cache/stats", tags=["System"])
+async def cache_stats():
+    return response_cache.stats()
+
+@app.get("/metrics", tags=["System"], response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(response_cache.stats()), media_type="text/plain; version=0.0.4")
+
 from app.routes.user import router as UserRouter
 from app.routes.bank import router as BankRouter
 from app.routes.card import router as CardRouter
 from app.routes.budget import router as BudgetRouter
 from app.routes.transaction import router as TransactionRouter
+from app.routes.analytics import router as AnalyticsRouter
+from app.routes.dashboard import router as DashboardRouter
+from app.routes.onboarding import router as OnboardingRouter
+from app.routes.merchant import router as MerchantRouter
+from app.routes.events import router as EventsRouter
 
 app.include_router(UserRouter, tags=["User"], prefix="/api")
 app.include_router(BankRouter, tags=["Banks"], prefix="/api")
 app.include_router(CardRouter, tags=["Cards"], prefix="/api")
 app.include_router(BudgetRouter, tags=["Budgets"], prefix="/api")
 app.include_router(TransactionRouter, tags=["Transactions"], prefix="/api")
+app.include_router(AnalyticsRouter, tags=["Analytics"], prefix="/api")
+app.include_router(DashboardRouter, tags=["Dashboard"], prefix="/api")
+app.include_router(OnboardingRouter, tags=["Onboarding"], prefix="/api")
+app.include_router(MerchantRouter, tags=["Merchants"], prefix="/api")
+app.include_router(EventsRouter, tags=["Events"], prefix="/api")
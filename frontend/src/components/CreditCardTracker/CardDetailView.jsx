@@ -29,11 +29,13 @@ const CardDetailView = () => {
     const userId = localStorage.getItem('userId');
     const [cardData, setCardData] = useState(null);
     const [transactions, setTransactions] = useState([]);
+    const [statements, setStatements] = useState([]);
     const [loading, setLoading] = useState(true);
 
     useEffect(() => {
         fetchCardData();
         fetchCardTransactions();
+        fetchStatements();
     }, [cardId]);
 
     const fetchCardData = async () => {
@@ -64,6 +66,17 @@ const CardDetailView = () => {
         }
     };
 
+    const fetchStatements = async () => {
+        try {
+            const response = await fetch(`${API_BASE_URL}/api/cards/${cardId}/statements`);
+            if (response.ok) {
+                setStatements(await response.json());
+            }
+        } catch (error) {
+            console.error('Error fetching statements:', error);
+        }
+    };
+
     if (loading || !cardData) {
         return (
             <div className="min-h-screen bg-gray-50 flex items-center justify-center">
@@ -170,7 +183,7 @@ const CardDetailView = () => {
 
                     {/* Tabs */}
                     <div className="flex border-b border-gray-100">
-                        {['transactions', 'analysis'].map(tab => (
+                        {['transactions', 'statements', 'analysis'].map(tab => (
                             <button
                                 key={tab}
                                 onClick={() => setActiveTab(tab)}
@@ -240,6 +253,28 @@ const CardDetailView = () => {
                             </div>
                         )}
 
+                        {activeTab === 'statements' && (
+                            <div className="space-y-3">
+                                <h3 className="font-bold text-gray-900">Billing Statements</h3>
+                                {statements.length === 0 ? (
+                                    <p className="text-gray-400 text-center py-8">Statements need a billing date on this card</p>
+                                ) : statements.map(st => (
+                                    <div key={st.cycleEnd} className="flex items-center justify-between p-4 rounded-xl border border-gray-100">
+                                        <div>
+                                            <h4 className="font-semibold text-gray-900">
+                                                {formatDate(st.cycleStart)} – {formatDate(st.cycleEnd)}
+                                                {!st.closed && <span className="ml-2 text-xs text-blue-600">Current cycle</span>}
+                                            </h4>
+                                            <p className="text-xs text-gray-500">
+                                                {st.transactionCount} transactions · Due {formatDate(st.dueDate)} · Min due ₹{st.minimumDue.toLocaleString()}
+                                            </p>
+                                        </div>
+                                        <span className="font-bold text-lg text-gray-900">₹{st.spend.toLocaleString()}</span>
+                                    </div>
+                                ))}
+                            </div>
+                        )}
+
                         {activeTab === 'analysis' && (
                             <div className="space-y-8">
                                 <div>
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { CreditCard, MoreVertical } from 'lucide-react';
 import { useNavigate } from 'react-router-dom';
 import { API_BASE_URL } from '../../utils/constants';
+import useUserEvents from '../../hooks/useUserEvents';
 
 const CreditCardsSummary = () => {
     const navigate = useNavigate();
@@ -32,6 +33,13 @@ const CreditCardsSummary = () => {
         fetchCards();
     }, []);
 
+    // Balances change as transactions are added anywhere; apply them in place
+    useUserEvents({
+        'card.outstanding': ({ cardId, currentOutstanding }) =>
+            setCards(prev => prev.map(card => card._id === cardId ? { ...card, currentOutstanding } : card)),
+        'card.created': (card) => setCards(prev => [...prev, card]),
+    });
+
     const getCardColor = (index) => {
         const colors = [
             'from-indigo-600 to-blue-500',
@@ -44,30 +44,14 @@ const FinancialOverview = () => {
             }
 
             try {
-                // Fetch bank accounts
-                const bankResponse = await fetch(`${API_BASE_URL}/api/bank-accounts/${userId}`);
-                const banks = bankResponse.ok ? await bankResponse.json() : [];
+                // One round trip for balances, cards and the current budget
+                const response = await fetch(`${API_BASE_URL}/api/dashboard/${userId}`);
+                const summary = response.ok ? await response.json() : null;
 
-                // Fetch cards
-                const cardsResponse = await fetch(`${API_BASE_URL}/api/cards/${userId}`);
-                const cards = cardsResponse.ok ? await cardsResponse.json() : [];
-
-                // Fetch budget for current month
-                const currentMonth = new Date().toISOString().slice(0, 7);
-                const budgetResponse = await fetch(`${API_BASE_URL}/api/budgets/${userId}/${currentMonth}`);
-                const budget = budgetResponse.ok ? await budgetResponse.json() : null;
-
-                // Calculate stats
-                const totalBalance = banks.reduce((sum, bank) => sum + (bank.balance || 0), 0);
-
-                const creditCards = cards.filter(c => c.card_type === 'credit');
-                const totalCreditLimit = creditCards.reduce((sum, card) => sum + (card.credit_limit || 0), 0);
-                const totalOutstanding = creditCards.reduce((sum, card) => sum + (card.current_outstanding || 0), 0);
-                const creditUtilization = totalCreditLimit > 0 ? (totalOutstanding / totalCreditLimit) * 100 : 0;
-
-                const monthlySpending = budget?.total_budget ?
-                    Object.values(budget.categories || {}).reduce((sum, val) => sum + val, 0) : 0;
-                const monthlySavings = budget?.savings_goal || 0;
+                const totalBalance = summary?.totalBalance || 0;
+                const creditUtilization = summary?.creditUtilization || 0;
+                const monthlySpending = summary?.budget?.spent || 0;
+                const monthlySavings = summary?.budget?.savingsGoal || 0;
 
                 setStats({
                     totalBalance,
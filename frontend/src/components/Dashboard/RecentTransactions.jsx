@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { ShoppingBag, Coffee, Car, ArrowRight, TrendingUp, TrendingDown, Wallet } from 'lucide-react';
 import { useNavigate, useLocation } from 'react-router-dom';
 import { API_BASE_URL } from '../../utils/constants';
+import useUserEvents from '../../hooks/useUserEvents';
 
 const CATEGORY_ICONS = {
     Shopping: ShoppingBag,
@@ -24,6 +25,14 @@ const RecentTransactions = () => {
         fetchRecentTransactions();
     }, [location.state]); // Re-fetch when location state changes
 
+    useUserEvents({
+        'transaction.created': (tx) => setTransactions(prev =>
+            [tx, ...prev].sort((a, b) => new Date(b.date) - new Date(a.date)).slice(0, 5)),
+        'transaction.deleted': (tx) => setTransactions(prev => prev.filter(t => t._id !== tx._id)),
+        'transactions.imported': () => fetchRecentTransactions(),
+        resync: () => fetchRecentTransactions(),
+    });
+
     const fetchRecentTransactions = async () => {
         const userId = localStorage.getItem('userId');
         if (!userId) {
@@ -2,6 +2,8 @@ import React, { useState } from 'react';
 import { X, Calendar, Tag, FileText } from 'lucide-react';
 import axios from 'axios';
 
+const CATEGORIES = ['Shopping', 'Food', 'Transport', 'Bills', 'Entertainment', 'Health', 'Education', 'Others'];
+
 const TransactionForm = ({ isOpen, onClose, onSuccess, userId, cardId = null, cardName = null }) => {
     const [formData, setFormData] = useState({
         merchant: '',
@@ -14,9 +16,24 @@ const TransactionForm = ({ isOpen, onClose, onSuccess, userId, cardId = null, ca
         isEMI: false
     });
     const [loading, setLoading] = useState(false);
+    const [suggestions, setSuggestions] = useState([]);
 
     if (!isOpen) return null;
 
+    const handleMerchantChange = async (e) => {
+        const { value } = e.target;
+        // Picking a known merchant also picks the category it is usually filed under
+        const match = suggestions.find(s => s.merchant === value);
+        setFormData(prev => ({ ...prev, merchant: value, ...(match && CATEGORIES.includes(match.category) ? { category: match.category } : {}) }));
+        if (match) return;
+        try {
+            const response = await axios.get('http://localhost:8000/api/merchants/suggest', { params: { userId, prefix: value } });
+            setSuggestions(response.data);
+        } catch (error) {
+            setSuggestions([]);
+        }
+    };
+
     const handleChange = (e) => {
         const { name, value, type, checked } = e.target;
         setFormData(prev => ({
@@ -46,7 +63,18 @@ const TransactionForm = ({ isOpen, onClose, onSuccess, userId, cardId = null, ca
                 payload.cardId = cardId;
             }
 
-            await axios.post('http://localhost:8000/api/transactions', payload);
+            try {
+                await axios.post('http://localhost:8000/api/transactions', payload);
+            } catch (error) {
+                // A duplicate comes back as a 409 with { message, transactionId }
+                if (error.response?.status !== 409 || error.response.data?.detail?.transactionId === undefined) {
+                    throw error;
+                }
+                if (!window.confirm('An identical transaction already exists. Record it again?')) {
+                    return;
+                }
+                await axios.post('http://localhost:8000/api/transactions', payload, { params: { allowDuplicate: true } });
+            }
 
             onSuccess();
             onClose();
@@ -95,11 +123,18 @@ const TransactionForm = ({ isOpen, onClose, onSuccess, userId, cardId = null, ca
                             type="text"
                             name="merchant"
                             value={formData.merchant}
-                            onChange={handleChange}
+                            onChange={handleMerchantChange}
+                            list="merchant-suggestions"
+                            autoComplete="off"
                             required
                             className="w-full px-4 py-2.5 rounded-lg border border-gray-200 focus:border-blue-500 outline-none"
                             placeholder="e.g. Amazon, Uber, Starbucks"
                         />
+                        <datalist id="merchant-suggestions">
+                            {suggestions.map(s => (
+                                <option key={s.merchant} value={s.merchant} />
+                            ))}
+                        </datalist>
                     </div>
 
                     <div className="grid grid-cols-2 gap-4">
@@ -112,7 +147,7 @@ const TransactionForm = ({ isOpen, onClose, onSuccess, userId, cardId = null, ca
                                 onChange={handleChange}
                                 className="w-full px-4 py-2.5 rounded-lg border border-gray-200 focus:border-blue-500 outline-none bg-white"
                             >
-                                {['Shopping', 'Food', 'Transport', 'Bills', 'Entertainment', 'Health', 'Education', 'Others'].map(c => (
+                                {CATEGORIES.map(c => (
                                     <option key={c} value={c}>{c}</option>
                                 ))}
                             </select>
@@ -13,30 +13,39 @@ export const useUser = () => {
 };
 
 export const UserProvider = ({ children }) => {
-    const [userId, setUserId] = useState(localStorage.getItem('userId') || null);
+    const [accessToken, setAccessToken] = useState(localStorage.getItem('accessToken') || null);
+    // Claims of the access token: sub (the user id), email, name and onboarding_completed
     const [user, setUser] = useState(null);
     const [loading, setLoading] = useState(false);
 
-    const login = (id) => {
-        setUserId(id);
-        localStorage.setItem('userId', id);
+    // Called with the token from login, and with the one reissued when onboarding completes
+    const login = (token) => {
+        setAccessToken(token);
+        localStorage.setItem('accessToken', token);
     };
 
     const logout = () => {
-        setUserId(null);
+        setAccessToken(null);
         setUser(null);
         localStorage.removeItem('userId');
+        localStorage.removeItem('accessToken');
     };
 
     const fetchUser = async () => {
-        if (!userId) return;
+        if (!accessToken) return;
 
         setLoading(true);
         try {
-            const response = await fetch(`${API_BASE_URL}/api/user/${userId}`);
+            // The token says who the user is, so no user document is looked up
+            const response = await fetch(`${API_BASE_URL}/api/auth/me`, {
+                headers: { Authorization: `Bearer ${accessToken}` }
+            });
             if (response.ok) {
-                const data = await response.json();
-                setUser(data);
+                const claims = await response.json();
+                setUser(claims);
+                localStorage.setItem('userId', claims.sub);
+            } else if (response.status === 401) {
+                logout();
             }
         } catch (error) {
             console.error('Error fetching user:', error);
@@ -46,13 +55,15 @@ export const UserProvider = ({ children }) => {
     };
 
     useEffect(() => {
-        if (userId) {
+        if (accessToken) {
             fetchUser();
         }
-    }, [userId]);
+    }, [accessToken]);
+
+    const userId = user?.sub || null;
 
     return (
-        <UserContext.Provider value={{ userId, user, loading, login, logout, refreshUser: fetchUser }}>
+        <UserContext.Provider value={{ userId, user, accessToken, loading, login, logout, refreshUser: fetchUser }}>
             {children}
         </UserContext.Provider>
     );
@@ -0,0 +1,41 @@
+import { useEffect, useRef } from 'react';
+import { API_BASE_URL } from '../utils/constants';
+
+// One EventSource per user, shared by every mounted component that listens
+const sources = {};
+
+function useUserEvents(handlers) {
+    // Handlers change every render; listeners read the latest ones through the ref
+    const handlersRef = useRef(handlers);
+    handlersRef.current = handlers;
+
+    useEffect(() => {
+        const userId = localStorage.getItem('userId');
+        if (!userId || typeof EventSource === 'undefined') {
+            return undefined;
+        }
+
+        if (!sources[userId]) {
+            sources[userId] = { source: new EventSource(`${API_BASE_URL}/api/events/${userId}`), count: 0 };
+        }
+        const entry = sources[userId];
+        entry.count += 1;
+
+        const listeners = Object.keys(handlersRef.current).map(type => {
+            const listener = (event) => handlersRef.current[type]?.(JSON.parse(event.data));
+            entry.source.addEventListener(type, listener);
+            return [type, listener];
+        });
+
+        return () => {
+            listeners.forEach(([type, listener]) => entry.source.removeEventListener(type, listener));
+            entry.count -= 1;
+            if (entry.count === 0) {
+                entry.source.close();
+                delete sources[userId];
+            }
+        };
+    }, []);
+}
+
+export default useUserEvents;
@@ -2,12 +2,15 @@ import React from 'react'
 import ReactDOM from 'react-dom/client'
 import App from './App.jsx'
 import { ToastProvider } from './context/ToastContext.jsx'
+import { UserProvider } from './context/UserContext.jsx'
 import './index.css'
 
 ReactDOM.createRoot(document.getElementById('root')).render(
 
     <ToastProvider>
-        <App />
+        <UserProvider>
+            <App />
+        </UserProvider>
     </ToastProvider>
 
 )
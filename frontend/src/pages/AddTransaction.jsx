@@ -18,6 +18,8 @@ const PAYMENT_METHODS = [
 
 const AddTransaction = () => {
     const navigate = useNavigate();
+    // One key per form, so a retried or double-clicked submit records the transaction once
+    const [idempotencyKey] = useState(() => crypto.randomUUID());
     const [formData, setFormData] = useState({
         transactionType: 'expense',
         amount: '',
@@ -108,12 +110,24 @@ const AddTransaction = () => {
                 status: 'completed'
             };
 
-            const response = await fetch(`${API_BASE_URL}/api/transactions`, {
+            const post = (query = '') => fetch(`${API_BASE_URL}/api/transactions${query}`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
+                headers: { 'Content-Type': 'application/json', 'Idempotency-Key': idempotencyKey },
                 body: JSON.stringify(payload)
             });
 
+            let response = await post();
+            let error = null;
+            if (response.status === 409) {
+                // A duplicate comes back as { message, transactionId }; the key isn't stored, so it can be reused
+                error = await response.json();
+                if (error.detail?.transactionId !== undefined
+                    && window.confirm('An identical transaction already exists. Record it again?')) {
+                    response = await post('?allowDuplicate=true');
+                    error = null;
+                }
+            }
+
             console.log('Transaction response status:', response.status);
 
             if (response.ok) {
@@ -121,9 +135,9 @@ const AddTransaction = () => {
                 console.log('Transaction created:', result);
                 navigate('/dashboard', { state: { refresh: true } });
             } else {
-                const error = await response.json();
+                error = error || await response.json();
                 console.error('Transaction error:', error);
-                setErrors({ submit: error.detail || 'Failed to add transaction' });
+                setErrors({ submit: error.detail?.message || error.detail || 'Failed to add transaction' });
             }
         } catch (error) {
             console.error('Network error:', error);
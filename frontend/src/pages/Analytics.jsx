@@ -8,9 +8,15 @@ import {
 } from 'recharts';
 import { API_BASE_URL } from '../utils/constants';
 
+const formatMonth = (month) => {
+    // "YYYY-MM" from the API; the day is only there to make it a valid date
+    const [year, index] = month.split('-').map(Number);
+    return new Date(year, index - 1, 1).toLocaleDateString('en-US', { month: 'short', year: 'numeric' });
+};
+
 const Analytics = () => {
     const navigate = useNavigate();
-    const [transactions, setTransactions] = useState([]);
+    const [analytics, setAnalytics] = useState(null);
     const [budget, setBudget] = useState(null);
     const [loading, setLoading] = useState(true);
     const [timeRange, setTimeRange] = useState('month'); // month, 3months, year
@@ -27,12 +33,14 @@ const Analytics = () => {
         }
 
         try {
-            const [txRes, budgetRes] = await Promise.all([
-                fetch(`${API_BASE_URL}/api/transactions/${userId}?limit=500`),
+            // Totals are aggregated on the server over every transaction, not just the latest page
+            const tz = Intl.DateTimeFormat().resolvedOptions().timeZone;
+            const [analyticsRes, budgetRes] = await Promise.all([
+                fetch(`${API_BASE_URL}/api/analytics/${userId}?tz=${encodeURIComponent(tz)}`),
                 fetch(`${API_BASE_URL}/api/budgets/${userId}/${new Date().toISOString().slice(0, 7)}`)
             ]);
 
-            if (txRes.ok) setTransactions(await txRes.json());
+            if (analyticsRes.ok) setAnalytics(await analyticsRes.json());
             if (budgetRes.ok) setBudget(await budgetRes.json());
         } catch (error) {
             console.error('Error fetching analytics:', error);
@@ -42,57 +50,27 @@ const Analytics = () => {
     };
 
     // Calculate metrics
-    const totalIncome = transactions
-        .filter(tx => tx.transactionType === 'income')
-        .reduce((sum, tx) => sum + tx.amount, 0);
-
-    const totalExpense = transactions
-        .filter(tx => tx.transactionType === 'expense')
-        .reduce((sum, tx) => sum + tx.amount, 0);
-
-    const netSavings = totalIncome - totalExpense;
-    const savingsRate = totalIncome > 0 ? (netSavings / totalIncome) * 100 : 0;
-
-    // Category breakdown
-    const categoryData = transactions
-        .filter(tx => tx.transactionType === 'expense')
-        .reduce((acc, tx) => {
-            acc[tx.category] = (acc[tx.category] || 0) + tx.amount;
-            return acc;
-        }, {});
+    const totalExpense = analytics?.totalSpent || 0;
+    const transactionCount = analytics?.transactionCount || 0;
+    const monthlyTotals = analytics?.monthly || [];
+    const averageMonthly = monthlyTotals.length > 0 ? totalExpense / monthlyTotals.length : 0;
+    const currentMonth = monthlyTotals.find(({ month }) => month === new Date().toISOString().slice(0, 7));
+    const budgetUsed = budget?.totalBudget > 0 ? ((currentMonth?.total || 0) / budget.totalBudget) * 100 : 0;
 
-    const categoryChartData = Object.entries(categoryData)
-        .map(([name, value]) => ({ name, value }))
-        .sort((a, b) => b.value - a.value)
+    // Category breakdown, largest first
+    const categoryChartData = (analytics?.categories || [])
+        .map(({ category, total }) => ({ name: category, value: total }))
         .slice(0, 6);
 
-    // Monthly trend
-    const monthlyData = transactions.reduce((acc, tx) => {
-        const month = new Date(tx.date).toLocaleDateString('en-US', { month: 'short', year: 'numeric' });
-        if (!acc[month]) {
-            acc[month] = { month, income: 0, expense: 0 };
-        }
-        if (tx.transactionType === 'income') {
-            acc[month].income += tx.amount;
-        } else {
-            acc[month].expense += tx.amount;
-        }
-        return acc;
-    }, {});
-
-    const monthlyChartData = Object.values(monthlyData).slice(-6);
+    // Monthly trend, oldest first
+    const monthlyChartData = monthlyTotals
+        .map(({ month, total }) => ({ month: formatMonth(month), expense: total }))
+        .slice(-6);
 
     // Payment method breakdown
-    const paymentMethodData = transactions
-        .filter(tx => tx.transactionType === 'expense')
-        .reduce((acc, tx) => {
-            acc[tx.paymentMethod] = (acc[tx.paymentMethod] || 0) + tx.amount;
-            return acc;
-        }, {});
-
-    const paymentChartData = Object.entries(paymentMethodData).map(([name, value]) => ({
-        name: name.replace('_', ' ').toUpperCase(),
-        value
+    const paymentChartData = (analytics?.paymentModes || []).map(({ paymentMode, total }) => ({
+        name: (paymentMode || 'Other').toUpperCase(),
+        value: total
     }));
 
     const COLORS = ['#3B82F6', '#8B5CF6', '#10B981', '#F59E0B', '#EF4444', '#EC4899'];
@@ -131,9 +109,9 @@ const Analytics = () => {
                     <div className="bg-white rounded-xl border border-gray-100 p-4">
                         <div className="flex items-center gap-2 mb-1">
                             <TrendingUp className="w-4 h-4 text-green-600" />
-                            <p className="text-xs text-gray-500 font-semibold">Total Income</p>
+                            <p className="text-xs text-gray-500 font-semibold">Transactions</p>
                         </div>
-                        <p className="text-2xl font-bold text-gray-900">₹{totalIncome.toLocaleString()}</p>
+                        <p className="text-2xl font-bold text-gray-900">{transactionCount.toLocaleString()}</p>
                     </div>
                     <div className="bg-white rounded-xl border border-gray-100 p-4">
                         <div className="flex items-center gap-2 mb-1">
@@ -145,26 +123,24 @@ const Analytics = () => {
                     <div className="bg-white rounded-xl border border-gray-100 p-4">
                         <div className="flex items-center gap-2 mb-1">
                             <TrendingUp className="w-4 h-4 text-blue-600" />
-                            <p className="text-xs text-gray-500 font-semibold">Net Savings</p>
+                            <p className="text-xs text-gray-500 font-semibold">Monthly Average</p>
                         </div>
-                        <p className={`text-2xl font-bold ${netSavings >= 0 ? 'text-green-600' : 'text-red-600'}`}>
-                            ₹{netSavings.toLocaleString()}
-                        </p>
+                        <p className="text-2xl font-bold text-gray-900">₹{Math.round(averageMonthly).toLocaleString()}</p>
                     </div>
                     <div className="bg-white rounded-xl border border-gray-100 p-4">
                         <div className="flex items-center gap-2 mb-1">
                             <Calendar className="w-4 h-4 text-purple-600" />
-                            <p className="text-xs text-gray-500 font-semibold">Savings Rate</p>
+                            <p className="text-xs text-gray-500 font-semibold">Budget Used This Month</p>
                         </div>
-                        <p className="text-2xl font-bold text-gray-900">{savingsRate.toFixed(1)}%</p>
+                        <p className={`text-2xl font-bold ${budgetUsed <= 100 ? 'text-gray-900' : 'text-red-600'}`}>{budgetUsed.toFixed(1)}%</p>
                     </div>
                 </div>
 
                 {/* Charts Grid */}
                 <div className="grid grid-cols-1 lg:grid-cols-2 gap-6">
-                    {/* Income vs Expense Trend */}
+                    {/* Spending Trend */}
                     <div className="bg-white rounded-xl border border-gray-100 p-6">
-                        <h3 className="font-bold text-gray-900 mb-4">Income vs Expense Trend</h3>
+                        <h3 className="font-bold text-gray-900 mb-4">Spending Trend</h3>
                         {monthlyChartData.length > 0 ? (
                             <ResponsiveContainer width="100%" height={250}>
                                 <LineChart data={monthlyChartData}>
@@ -173,7 +149,6 @@ const Analytics = () => {
                                     <YAxis />
                                     <Tooltip formatter={(value) => `₹${value.toLocaleString()}`} />
                                     <Legend />
-                                    <Line type="monotone" dataKey="income" stroke="#10B981" strokeWidth={2} name="Income" />
                                     <Line type="monotone" dataKey="expense" stroke="#EF4444" strokeWidth={2} name="Expense" />
                                 </LineChart>
                             </ResponsiveContainer>
@@ -221,7 +196,6 @@ const Analytics = () => {
                                     <YAxis />
                                     <Tooltip formatter={(value) => `₹${value.toLocaleString()}`} />
                                     <Legend />
-                                    <Bar dataKey="income" fill="#10B981" name="Income" radius={[8, 8, 0, 0]} />
                                     <Bar dataKey="expense" fill="#EF4444" name="Expense" radius={[8, 8, 0, 0]} />
                                 </BarChart>
                             </ResponsiveContainer>
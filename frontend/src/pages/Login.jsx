@@ -2,10 +2,12 @@ import React, { useState, useEffect } from 'react';
 import { useNavigate, Link, useLocation } from 'react-router-dom';
 import { Mail, Lock, Eye, EyeOff, AlertCircle, CheckCircle } from 'lucide-react';
 import { API_BASE_URL } from '../utils/constants';
+import { useUser } from '../context/UserContext';
 
 const Login = () => {
     const navigate = useNavigate();
     const location = useLocation();
+    const { login } = useUser();
     const [formData, setFormData] = useState({
         email: '',
         password: ''
@@ -55,8 +57,9 @@ const Login = () => {
             if (response.ok) {
                 const user = await response.json();
 
-                // Save userId to localStorage
+                // Save userId and the access token to localStorage
                 localStorage.setItem('userId', user._id);
+                login(user.access_token);
 
                 // Check if user has completed onboarding
                 if (user.onboarding_completed) {
@@ -3,6 +3,7 @@ import { useNavigate } from 'react-router-dom';
 import Stepper from '../components/Onboarding/Stepper';
 import useLocalStorage from '../hooks/useLocalStorage';
 import { ONBOARDING_STEPS, API_BASE_URL } from '../utils/constants';
+import { useUser } from '../context/UserContext';
 
 // Step Components
 import PersonalInfo from '../components/Onboarding/PersonalInfo';
@@ -15,6 +16,7 @@ import ReviewConfirm from '../components/Onboarding/ReviewConfirm';
 
 const Onboarding = () => {
     const navigate = useNavigate();
+    const { login } = useUser();
     const [currentStep, setCurrentStep] = useLocalStorage('onboarding_step', 1);
     const [completedSteps, setCompletedSteps] = useLocalStorage('onboarding_completed', []);
     const [formData, setFormData] = useLocalStorage('onboarding_data', {
@@ -70,71 +72,34 @@ const Onboarding = () => {
                 return;
             }
 
-            // 1. Update User with personal and employment info
-            const userUpdatePayload = {
-                personal_info: toSnakeCase(formData.personalInfo),
-                employment_info: formData.employmentInfo
-                    ? toSnakeCase(formData.employmentInfo)
-                    : { monthly_salary: 0, status: 'Unemployed' },
-                onboarding_completed: true
-            };
-
-            const userResponse = await fetch(`${API_BASE_URL}/api/user/${userId}`, {
-                method: 'PUT',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(userUpdatePayload)
-            });
-
-            if (!userResponse.ok) {
-                const errorData = await userResponse.json();
-                console.error("User update error:", errorData);
-                throw new Error("User update failed");
-            }
-
-            // 2. Create Bank Accounts
-            for (const acc of formData.bankAccounts) {
-                const bankPayload = {
-                    userId,
-                    bankName: acc.bankName,
-                    accountNumber: acc.accountNumber,
-                    ifscCode: acc.ifscCode,
-                    accountType: acc.accountType,
-                    branchName: acc.branchName,
-                    isPrimary: acc.isPrimary || false
-                };
-                await fetch(`${API_BASE_URL}/api/bank-accounts`, {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(bankPayload)
-                });
-            }
-
-            // 3. Create Cards
-            for (const card of formData.cardDetails) {
-                const cardPayload = {
-                    userId,
-                    cardType: card.cardType,
-                    cardNumber: card.cardNumber,
-                    cardHolderName: card.cardHolderName,
-                    bankName: card.bankName,
-                    expiryDate: card.expiryDate,
-                    cardProvider: card.cardProvider || 'Visa',
-                    // Credit specific
-                    creditLimit: card.creditLimit ? Number(card.creditLimit) : undefined,
-                    currentOutstanding: card.currentOutstanding ? Number(card.currentOutstanding) : 0,
-                    billingDate: card.billingDate ? Number(card.billingDate) : undefined,
-                    dueDate: card.dueDate ? Number(card.dueDate) : undefined,
-                    // Debit specific
-                    dailyLimit: card.dailyLimit ? Number(card.dailyLimit) : undefined
-                };
-                await fetch(`${API_BASE_URL}/api/cards`, {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(cardPayload)
-                });
-            }
-
-            // 4. Create Budget
+            const bankAccounts = formData.bankAccounts.map(acc => ({
+                userId,
+                bankName: acc.bankName,
+                accountNumber: acc.accountNumber,
+                ifscCode: acc.ifscCode,
+                accountType: acc.accountType,
+                branchName: acc.branchName,
+                isPrimary: acc.isPrimary || false
+            }));
+
+            const cards = formData.cardDetails.map(card => ({
+                userId,
+                cardType: card.cardType,
+                cardNumber: card.cardNumber,
+                cardHolderName: card.cardHolderName,
+                bankName: card.bankName,
+                expiryDate: card.expiryDate,
+                cardProvider: card.cardProvider || 'Visa',
+                // Credit specific
+                creditLimit: card.creditLimit ? Number(card.creditLimit) : undefined,
+                currentOutstanding: card.currentOutstanding ? Number(card.currentOutstanding) : 0,
+                billingDate: card.billingDate ? Number(card.billingDate) : undefined,
+                dueDate: card.dueDate ? Number(card.dueDate) : undefined,
+                // Debit specific
+                dailyLimit: card.dailyLimit ? Number(card.dailyLimit) : undefined
+            }));
+
+            let budget = null;
             if (formData.budget && formData.budget.totalBudget) {
                 const currentMonth = new Date().toISOString().slice(0, 7); // YYYY-MM
                 // format categories as dict {name: amount}
@@ -144,20 +109,40 @@ const Onboarding = () => {
                         if (c.amount > 0) catDict[c.name] = c.amount;
                     });
                 }
+                budget = {
+                    userId,
+                    monthYear: currentMonth,
+                    totalBudget: Number(formData.budget.totalBudget),
+                    savingsGoal: Number(formData.budget.savingsGoal || 0),
+                    categories: catDict
+                };
+            }
 
-                await fetch(`${API_BASE_URL}/api/budgets`, {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({
-                        userId,
-                        monthYear: currentMonth,
-                        totalBudget: Number(formData.budget.totalBudget),
-                        savingsGoal: Number(formData.budget.savingsGoal || 0),
-                        categories: catDict
-                    })
-                });
+            // Profile, accounts, cards and budget are saved together; nothing is kept if any part fails
+            const response = await fetch(`${API_BASE_URL}/api/onboarding/${userId}`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    personal_info: toSnakeCase(formData.personalInfo),
+                    employment_info: formData.employmentInfo
+                        ? toSnakeCase(formData.employmentInfo)
+                        : { monthly_salary: 0, status: 'Unemployed' },
+                    bankAccounts,
+                    cards,
+                    budget
+                })
+            });
+
+            if (!response.ok) {
+                const errorData = await response.json();
+                console.error("Onboarding error:", errorData);
+                throw new Error("Onboarding failed");
             }
 
+            // The old token still says onboarding is unfinished
+            const result = await response.json();
+            login(result.access_token);
+
             // Success!
             setFormData({});
             setCompletedSteps([]);
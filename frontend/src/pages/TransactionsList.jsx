@@ -43,7 +43,7 @@ const TransactionsList = () => {
 
         setLoading(true);
         try {
-            let url = `${API_BASE_URL}/api/transactions/${userId}?limit=100`;
+            let url = `${API_BASE_URL}/api/transactions/user/${userId}?limit=100`;
 
             if (filters.category !== 'All') {
                 url += `&category=${encodeURIComponent(filters.category)}`;